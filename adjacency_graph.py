@@ -0,0 +1,186 @@
+from array import array
+
+from networkx import DiGraph, NetworkXNoPath, NodeNotFound
+
+
+class AdjacencyGraph:
+    """ Directed graph of search states that stores edges in integer arrays.
+
+    Supports the parts of the networkx DiGraph interface that BoardGraph
+    uses, but each node only costs an id and a couple of arrays, instead of
+    nested dictionaries. Edges only keep their move names, plus any other
+    attributes that are passed in. Call to_networkx() for anything else.
+    """
+    def __init__(self):
+        self.node_ids = {}  # {node: node_id}
+        self.node_list = []  # [node]
+
+        # [array([target_id, move_id, target_id, move_id, ...]) or None]
+        self.successors = []
+        self.predecessors = []  # [array([source_id, ...]) or None]
+        self.move_ids = {}  # {move: move_id}
+        self.move_list = []  # [move]
+        self.edge_attrs = {}  # {(source_id, target_id): {name: value}}
+
+    def __len__(self):
+        return len(self.node_list)
+
+    def __contains__(self, node):
+        return node in self.node_ids
+
+    def __iter__(self):
+        return iter(self.node_list)
+
+    def __getitem__(self, node):
+        """ Find the successors of a node: {target: {name: value}}. """
+        node_id = self.node_ids[node]
+        return {self.node_list[target_id]: self.get_edge_data(node, target)
+                for target_id, target in self.iter_successor_ids(node_id)}
+
+    def iter_successor_ids(self, node_id):
+        successors = self.successors[node_id] or ()
+        for i in range(0, len(successors), 2):
+            target_id = successors[i]
+            yield target_id, self.node_list[target_id]
+
+    def nodes(self):
+        return self.node_list
+
+    def has_node(self, node):
+        return node in self.node_ids
+
+    def add_node(self, node) -> int:
+        """ Add a node, if it isn't already in the graph.
+
+        :return: the node's id
+        """
+        node_id = self.node_ids.get(node)
+        if node_id is None:
+            node_id = self.node_ids[node] = len(self.node_list)
+            self.node_list.append(node)
+            self.successors.append(None)
+            self.predecessors.append(None)
+        return node_id
+
+    def add_edge(self, source, target, move=None, **attrs):
+        """ Add an edge, or replace its attributes if it's already there. """
+        source_id = self.add_node(source)
+        target_id = self.add_node(target)
+        move_id = self.move_ids.get(move)
+        if move_id is None:
+            move_id = self.move_ids[move] = len(self.move_list)
+            self.move_list.append(move)
+        if attrs:
+            self.edge_attrs[source_id, target_id] = attrs
+        successors = self.successors[source_id]
+        if successors is None:
+            self.successors[source_id] = array('i', (target_id, move_id))
+            self.add_predecessor(source_id, target_id)
+            return
+        for i in range(0, len(successors), 2):
+            if successors[i] == target_id:
+                successors[i+1] = move_id
+                return
+        successors.append(target_id)
+        successors.append(move_id)
+        self.add_predecessor(source_id, target_id)
+
+    def add_predecessor(self, source_id, target_id):
+        predecessors = self.predecessors[target_id]
+        if predecessors is None:
+            self.predecessors[target_id] = array('i', (source_id,))
+        else:
+            predecessors.append(source_id)
+
+    def get_edge_data(self, source, target, default=None):
+        source_id = self.node_ids.get(source)
+        target_id = self.node_ids.get(target)
+        if source_id is None or target_id is None:
+            return default
+        successors = self.successors[source_id] or ()
+        for i in range(0, len(successors), 2):
+            if successors[i] == target_id:
+                attrs = dict(move=self.move_list[successors[i+1]])
+                attrs.update(self.edge_attrs.get((source_id, target_id), {}))
+                return attrs
+        return default
+
+    def out_degree(self, node) -> int:
+        successors = self.successors[self.node_ids[node]]
+        return 0 if successors is None else len(successors) // 2
+
+    def shortest_path(self, source, target) -> list:
+        """ Find a shortest path from source to target.
+
+        Searches from both ends, and visits edges in the same order as
+        networkx's shortest_path(), so it picks the same path.
+        :raises NodeNotFound: if source or target isn't in the graph
+        :raises NetworkXNoPath: if target can't be reached from source
+        """
+        if source not in self.node_ids:
+            raise NodeNotFound(f"Source {source} is not in G")
+        if target not in self.node_ids:
+            raise NodeNotFound(f"Target {target} is not in G")
+        source_id = self.node_ids[source]
+        target_id = self.node_ids[target]
+        pred, succ, meeting_id = self.meet_in_middle(source_id, target_id)
+        path_ids = []
+        node_id = meeting_id
+        while node_id is not None:
+            path_ids.append(node_id)
+            node_id = pred[node_id]
+        path_ids.reverse()
+        node_id = succ[path_ids[-1]]
+        while node_id is not None:
+            path_ids.append(node_id)
+            node_id = succ[node_id]
+        return [self.node_list[node_id] for node_id in path_ids]
+
+    def meet_in_middle(self, source_id, target_id):
+        """ Search forward from the source and back from the target.
+
+        :return: (pred, succ, meeting_id) where pred maps node ids back
+            toward the source, and succ maps node ids on toward the target.
+        """
+        if source_id == target_id:
+            return {target_id: None}, {source_id: None}, source_id
+        pred = {source_id: None}
+        succ = {target_id: None}
+        forward_fringe = [source_id]
+        reverse_fringe = [target_id]
+        while forward_fringe and reverse_fringe:
+            if len(forward_fringe) <= len(reverse_fringe):
+                this_level = forward_fringe
+                forward_fringe = []
+                for v in this_level:
+                    successors = self.successors[v] or ()
+                    for i in range(0, len(successors), 2):
+                        w = successors[i]
+                        if w not in pred:
+                            forward_fringe.append(w)
+                            pred[w] = v
+                        if w in succ:
+                            return pred, succ, w
+            else:
+                this_level = reverse_fringe
+                reverse_fringe = []
+                for v in this_level:
+                    for w in self.predecessors[v] or ():
+                        if w not in succ:
+                            succ[w] = v
+                            reverse_fringe.append(w)
+                        if w in pred:
+                            return pred, succ, w
+        raise NetworkXNoPath(f"No path between {self.node_list[source_id]} "
+                             f"and {self.node_list[target_id]}.")
+
+    def to_networkx(self) -> DiGraph:
+        """ Copy all the nodes and edges into a networkx graph. """
+        graph = DiGraph()
+        graph.add_nodes_from(self.node_list)
+        for source_id, source in enumerate(self.node_list):
+            for target_id, target in self.iter_successor_ids(source_id):
+                graph.add_edge(source,
+                               target,
+                               **self.get_edge_data(source, target))
+        return graph
@@ -1,13 +1,19 @@
+import os
 import random
 import sys
 import typing
 from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from concurrent.futures.process import ProcessPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 from sys import maxsize
 
+from adjacency_graph import AdjacencyGraph
 from domino_puzzle import (Board, BoardGraph, GraphLimitExceeded, DiceSet,
-                           ArrowSet, MoveDescription)
+                           ArrowSet, MoveDescription, PackedStateCodec)
+from event_log import EventLog
 from evo import Individual, Evolution
+from fitness_cache import FitnessCache, cached_fitness
 
 DEFAULT_BLANKS = 'touching'
 
@@ -60,9 +66,15 @@ class BeesProblem(Individual):
 
 
 class BeesFitnessCalculator:
-    def __init__(self, target_length=100, size_limit=11_200):
+    def __init__(self,
+                 target_length=100,
+                 size_limit=11_200,
+                 cache: FitnessCache = None,
+                 process_count: int = 3):
         self.target_length = target_length
         self.size_limit = size_limit
+        self.cache = cache
+        self.process_count = process_count  # for each graph walk
         self.details = []
         self.summaries = []
 
@@ -76,6 +88,14 @@ class BeesFitnessCalculator:
         self.details.clear()
         return display
 
+    def get_cache_key(self, value):
+        return FitnessCache.make_key('bees',
+                                     value['start'],
+                                     value.get('blanks'),
+                                     self.target_length,
+                                     self.size_limit)
+
+    @cached_fitness
     def calculate(self, problem):
         """ Calculate fitness score based on the solution.
 
@@ -94,8 +114,13 @@ class BeesFitnessCalculator:
         fitness = 0
         blanks = value.get('blanks')
         are_all_blanks_wild = blanks == 'wild'
+        graph_size = 0
         for queen_pips in range(3, max_pips+1):
-            graph = BeesGraph(process_count=3,
+            # Graphs share the worker pool, see get_worker_pool(), so every
+            # queen value uses the same workers and their index_sight_lines()
+            # cache. The queen values run one at a time, because each walk
+            # already keeps the pool busy.
+            graph = BeesGraph(process_count=self.process_count,
                               are_all_blanks_wild=are_all_blanks_wild)
             board.place_dice(queen_pips)
             try:
@@ -106,6 +131,7 @@ class BeesFitnessCalculator:
                 print('Failed to solve:', file=sys.stderr)
                 print(board.display(), file=sys.stderr)
                 raise
+            graph_size += len(graph.graph)
             min_remaining = graph.min_remaining
             if min_remaining is None:
                 min_remaining = board.width + board.height
@@ -138,6 +164,7 @@ class BeesFitnessCalculator:
         self.summaries.append('\n    '.join(round_summaries))
         self.details.append(f'{board.width}x{board.height} {lengths_display}')
 
+        problem.results['graph_size'] = graph_size
         value['fitness'] = fitness
         return fitness
 
@@ -166,6 +193,25 @@ class BeesBoard(Board):
                  arrows: ArrowSet = None):
         super().__init__(width, height, max_pips, dice_set, arrows)
         self.queen_pips = 0
+        self.sight_lines = None  # See get_sight_lines().
+
+    def get_sight_lines(self) -> typing.Tuple[tuple, tuple]:
+        """ Index the cells in each row and column, see index_sight_lines().
+
+        The index is built the first time, so call it after all the cells
+        are filled.
+        """
+        if self.sight_lines is None:
+            column_pips = tuple(tuple(cell.pips for cell in column)
+                                for column in self.cells)
+            self.sight_lines = index_sight_lines(column_pips)
+        return self.sight_lines
+
+    def crop(self, border: int = 0) -> 'BeesBoard':
+        # No borders, just like create().
+        board = super().crop(border=0)
+        board.queen_pips = self.queen_pips
+        return board
 
     def place_dice(self, max_pips: int = None):
         if max_pips is None:
@@ -192,45 +238,77 @@ class BeesBoard(Board):
         return False
 
 
+@lru_cache(maxsize=1000)
+def index_sight_lines(column_pips: tuple) -> typing.Tuple[tuple, tuple]:
+    """ List the cells a die can see along each row and column.
+
+    Dice move but the pips never change while a puzzle is solved, so all
+    the boards from one search share an index.
+    :param column_pips: a tuple of pips for each column of the board
+    :return: (rows, columns) where rows[y] is (((x, y), pips), ...) for
+        each x, and columns[x] is (((x, y), pips), ...) for each y.
+    """
+    width = len(column_pips)
+    height = len(column_pips[0])
+    rows = tuple(tuple(((x, y), column_pips[x][y]) for x in range(width))
+                 for y in range(height))
+    columns = tuple(tuple(((x, y), pips) for y, pips in enumerate(column))
+                    for x, column in enumerate(column_pips))
+    return rows, columns
+
+
 def count_gaps(positions: typing.Set[typing.Tuple[int, int]],
                width: int,
                height: int):
+    """ Count the gaps between one group of positions and the rest.
+
+    Pick one position, group all the positions that connect to it, then add
+    up the gap between each other position and the nearest grouped one.
+    :param positions: the positions to count gaps between
+    :param width: the board width
+    :param height: the board height
+    :return: the total number of gap cells
+    """
     if not positions:
         return 0
     unvisited = set(positions)
-    max_gap = width + height
-    old_total = max_gap * len(unvisited)
-    grouped = set()
-    grouped.add(unvisited.pop())
-    while True:
-        total_gaps = 0
-        while unvisited:
-            x1, y1 = unvisited.pop()
-            min_gap = width + height
-            for x2, y2 in grouped:
-                gap = abs(x1 - x2) + abs(y1 - y2) - 1
-                if gap == 0:
+    start = unvisited.pop()
+    grouped = [start]
+    boundary = [start]
+    while boundary:
+        x, y = boundary.pop()
+        for neighbour in ((x-1, y), (x+1, y), (x, y-1), (x, y+1)):
+            if neighbour in unvisited:
+                unvisited.remove(neighbour)
+                grouped.append(neighbour)
+                boundary.append(neighbour)
+    total_gaps = 0
+    for x1, y1 in unvisited:
+        min_distance = width + height
+        for x2, y2 in grouped:
+            distance = abs(x1 - x2) + abs(y1 - y2)
+            if distance < min_distance:
+                min_distance = distance
+                if distance == 2:
+                    # Neighbours were already grouped, so this is the best.
                     break
-                elif gap < min_gap:
-                    min_gap = gap
-            else:
-                total_gaps += min_gap
-                continue
-            grouped.add((x1, y1))
-        if total_gaps == 0 or total_gaps == old_total:
-            break
-        old_total = total_gaps
-        unvisited = positions - grouped
+        total_gaps += min_distance - 1
     return total_gaps
 
 
 class BeesGraph(BoardGraph):
+    state_codec = PackedStateCodec()
+    board_cache_size = 5000
+    graph_class = AdjacencyGraph
+    expansion_batch_size = 32
+
     def __init__(self,
                  board_class=BeesBoard,
                  process_count: int = 0,
                  debug=False,
-                 are_all_blanks_wild=False):
-        super().__init__(board_class, process_count)
+                 are_all_blanks_wild=False,
+                 executor: ProcessPoolExecutor = None):
+        super().__init__(board_class, process_count, executor)
         self.debug = debug
         self.are_all_blanks_wild = are_all_blanks_wild
         self.solution_states = set()
@@ -259,37 +337,35 @@ class BeesGraph(BoardGraph):
         board.dice_set = None
         board_display = board.display()
         board.dice_set = dice_set
+
+        def display_with_dice():
+            return f'{board_display}---\ndice:{dice_set.text}\n'
+
+        sight_lines = board.get_sight_lines()
+        wild_positions = self.find_wild_positions(board)
         for (x, y), pips in list(dice_set.items()):
             if pips == board.queen_pips:
                 continue
             positions = [(x, y)]
-            for extended_positions in self.extend_positions(positions, board):
+            for extended_positions in self.extend_positions(positions,
+                                                            board,
+                                                            sight_lines,
+                                                            wild_positions):
                 move = dice_set.move(*extended_positions)
-                dice_display = dice_set.text
-                combined_display = f'{board_display}---\ndice:{dice_display}\n'
-                total_gaps = self.check_progress(board)
+                combined_display, total_gaps = self.describe_state(
+                    board,
+                    cropped=False,
+                    display=display_with_dice)
+                x2, y2 = extended_positions[-1]
                 yield MoveDescription(move,
                                       combined_display,
-                                      remaining=total_gaps)
+                                      remaining=total_gaps,
+                                      delta=(('die', x, y, x2-x, y2-y),))
                 dice_set.move(extended_positions[-1], (x, y))
 
-    def extend_positions(self, positions: typing.List[typing.Tuple[int, int]], board: BeesBoard):
-        pips = board.dice_set.dice[positions[0]]
-        x, y = positions[-1]
-
-        if len(positions) <= 1:
-            dx = dy = 0
-        else:
-            # Force moves over a die to turn a corner.
-            x2, y2 = positions[-2]
-            dx = x - x2
-            dy = y - y2
-        targets = []
-        if dx == 0:
-            targets.extend((x2, y) for x2 in range(board.width))
-        if dy == 0:
-            targets.extend((x, y2) for y2 in range(board.height))
-
+    def find_wild_positions(self, board: BeesBoard) -> typing.Set[
+            typing.Tuple[int, int]]:
+        """ Find the empty cells that any die can move to. """
         wild_positions = set()
         if self.are_all_blanks_wild:
             for x in range(board.width):
@@ -306,19 +382,65 @@ class BeesGraph(BoardGraph):
                     if wild_position not in board.dice_set.dice:
                         # Wild position is not occupied, can use it.
                         wild_positions.add(wild_position)
+        return wild_positions
+
+    def extend_positions(
+            self,
+            positions: typing.List[typing.Tuple[int, int]],
+            board: BeesBoard,
+            sight_lines: typing.Tuple[tuple, tuple] = None,
+            wild_positions: typing.Set[typing.Tuple[int, int]] = None):
+        """ Yield the paths a die can take, starting with positions.
+
+        The positions list is extended in place, and the same list is
+        yielded for every path, so copy it if you need to keep it after
+        the next path is generated.
+        :param positions: the die's starting position, followed by any dice
+            it has already turned on
+        :param board: the board the die is moving on
+        :param sight_lines: from board.get_sight_lines(), if already known
+        :param wild_positions: from find_wild_positions(), if already known
+        """
+        if sight_lines is None:
+            sight_lines = board.get_sight_lines()
+        if wild_positions is None:
+            wild_positions = self.find_wild_positions(board)
+        dice = board.dice_set.dice
+        pips = dice[positions[0]]
+        x, y = positions[-1]
+
+        if len(positions) <= 1:
+            dx = dy = 0
+        else:
+            # Force moves over a die to turn a corner.
+            x2, y2 = positions[-2]
+            dx = x - x2
+            dy = y - y2
+        rows, columns = sight_lines
+        lines = []
+        if dx == 0:
+            lines.append(rows[y])
+        if dy == 0:
+            lines.append(columns[x])
 
         direct_positions = []
-        for position2 in targets:
-            if position2 in positions:
-                continue
-            x2, y2 = position2
-            pips2 = board[x2][y2].pips
-            if pips2 == pips or position2 in wild_positions:
-                direct_positions.append(position2)
-            elif position2 in board.dice_set.dice:
-                yield from self.extend_positions(positions + [position2], board)
+        for line in lines:
+            for position2, pips2 in line:
+                if position2 in positions:
+                    continue
+                if pips2 == pips or position2 in wild_positions:
+                    direct_positions.append(position2)
+                elif position2 in dice:
+                    positions.append(position2)
+                    yield from self.extend_positions(positions,
+                                                     board,
+                                                     sight_lines,
+                                                     wild_positions)
+                    positions.pop()
         for position2 in direct_positions:
-            yield positions + [position2]
+            positions.append(position2)
+            yield positions
+            positions.pop()
 
     def check_progress(self, board: BeesBoard) -> int:
         """ See how close a board is to a solution. """
@@ -353,11 +475,34 @@ def parse_args():
                         type=int,
                         default=2,
                         help='Number of evolutionary pools.')
+    parser.add_argument('--island_epochs',
+                        type=int,
+                        default=0,
+                        help='Number of epochs that each pool evolves in its '
+                             'own worker process before the best problems '
+                             'migrate to the next pool. 0 steps all pools '
+                             'together, and scores problems in the workers.')
     parser.add_argument('--epochs',
                         '-e',
                         type=int,
                         default=1000,
                         help='Number of evolutionary epochs.')
+    parser.add_argument('--cache',
+                        help='SQLite file to store fitness results in, so a '
+                             'restarted search skips problems it has scored.')
+    parser.add_argument('--processes',
+                        type=int,
+                        default=os.cpu_count(),
+                        help='Number of worker processes that score new '
+                             'problems, each searching serially. 0 scores '
+                             'them one at a time, with a few processes for '
+                             'each search.')
+    parser.add_argument('--events',
+                        help='JSON Lines file to append progress events to. '
+                             'Watch it with event_log.py.')
+    parser.add_argument('--resume',
+                        help='Checkpoint file to save progress in. If it '
+                             'exists, the search continues from it.')
     return parser.parse_args()
 
 
@@ -374,7 +519,14 @@ def main():
     print(f'Searching for solutions of length {args.target_length} '
           f'with up to {max_pips} pips.')
     target_total = args.target_length * (max_pips - 2)
-    fitness_calculator = BeesFitnessCalculator(target_length=args.target_length)
+    cache = None if args.cache is None else FitnessCache(args.cache)
+    fitness_calculator = BeesFitnessCalculator(target_length=args.target_length,
+                                               cache=cache)
+    if args.processes:
+        # Each evolution worker searches serially, instead of starting its
+        # own pool of search workers.
+        fitness_calculator.process_count = 0
+    event_log = None if args.events is None else EventLog(args.events)
     init_params = dict(max_pips=max_pips,
                        width=max_pips+2,
                        height=max_pips+1)
@@ -386,26 +538,40 @@ def main():
         pair_params=None,
         mutate_params=None,
         init_params=init_params,
-        pool_count=args.num_pools)
+        pool_count=args.num_pools,
+        process_count=args.processes,
+        event_log=event_log,
+        checkpoint_path=args.resume,
+        resume_path=args.resume,
+        island_epochs=args.island_epochs)
     n_epochs = args.epochs
 
     hist = []
-    for i in range(n_epochs):
-        top_individual = evo.pool.individuals[-1]
-        top_fitness = evo.pool.fitness(top_individual)
-        mid_fitness = evo.pool.fitness(evo.pool.individuals[-len(evo.pool.individuals)//5])
-        summaries = []
-        for pool in evo.pools:
-            pool_fitness = pool.fitness(pool.individuals[-1])
-            total = pool_fitness % 1000
-            summaries.append(f'{total}/{target_total}')
-        print(i,
-              top_fitness,
-              mid_fitness,
-              repr(top_individual.value['start']),
-              ', '.join(summaries))
-        hist.append(top_fitness)
-        evo.step()
+    try:
+        for i in range(evo.start_epoch, n_epochs, evo.epochs_per_step):
+            # The last step stops at n_epochs.
+            step_epochs = min(evo.epochs_per_step, n_epochs - i)
+            top_individual = evo.pool.individuals[-1]
+            top_fitness = evo.pool.fitness(top_individual)
+            mid_fitness = evo.pool.fitness(
+                evo.pool.individuals[-len(evo.pool.individuals)//5])
+            summaries = []
+            for pool in evo.pools:
+                pool_fitness = pool.fitness(pool.individuals[-1])
+                total = pool_fitness % 1000
+                summaries.append(f'{total}/{target_total}')
+            print(i,
+                  top_fitness,
+                  mid_fitness,
+                  repr(top_individual.value['start']),
+                  ', '.join(summaries))
+            hist.extend([top_fitness] * step_epochs)
+            evo.step(step_epochs)
+            evo.log_epoch(i)
+            evo.check_checkpoint(i + step_epochs)
+        evo.save_checkpoint(n_epochs)
+    finally:
+        evo.close()
 
     best = evo.pool.individuals[-1]
     for problem in evo.pool.individuals:
@@ -416,6 +582,9 @@ def main():
     print(solution)
     duration = datetime.now() - start_time
     print(f'Finished {n_epochs} epochs in {duration}.')
+    evo.log_finish(n_epochs, duration)
+    if event_log is not None:
+        event_log.close()
 
 
 if __name__ == '__main__':
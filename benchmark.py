@@ -0,0 +1,180 @@
+""" Time the puzzle searches on the published problems.
+
+Each problem's walk() runs in a fresh process, so its peak memory isn't
+mixed up with the other problems. Results are written to a CSV file, so
+runs can be compared before and after a change.
+"""
+import re
+import resource
+import typing
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from concurrent.futures import ProcessPoolExecutor
+from csv import DictWriter
+from dataclasses import dataclass
+from pathlib import Path
+from time import perf_counter
+
+from adding_puzzle import AddingBoardGraph
+from bees import BeesBoard, BeesGraph
+from blocking_puzzle import BlockingBoardGraph
+from book_parser import parse, Styles
+from domino_puzzle import Board, BoardGraph, CaptureBoardGraph, GraphLimitExceeded
+from dominosa import DominosaBoard, DominosaGraph, LEVEL_WEIGHTS
+from drivers import DriversBoard, DriversGraph
+from mirror import MirrorGraph
+from queued_board import QueuedBoard
+
+RULES_FOLDER = Path(__file__).parent / 'raw_rules'
+RESULT_COLUMNS = ['puzzle',
+                  'problem',
+                  'graph',
+                  'states',
+                  'is_limited',
+                  'is_solved',
+                  'seconds',
+                  'states_per_second',
+                  'peak_memory_mb']
+
+
+@dataclass
+class BenchmarkCase:
+    puzzle: str  # Section heading, like 'Mirror Donimoes'
+    problem: str  # Problem heading, like 'Problem 3'
+    start: str  # Diagram text
+
+
+def parse_args():
+    parser = ArgumentParser(description='Time searches on published problems.',
+                            formatter_class=ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--patterns', '-p',
+                        help='Regex patterns for the puzzle and problem '
+                             'headings, separated by a colon.',
+                        default='.*:problem .*')
+    parser.add_argument('--size_limit',
+                        type=int,
+                        default=100_000,
+                        help='Maximum number of states in each search.')
+    parser.add_argument('--output', '-o',
+                        default='benchmark.csv',
+                        help='CSV file to write results to.')
+    args = parser.parse_args()
+    args.patterns = args.patterns.split(':')
+    if len(args.patterns) != 2:
+        parser.error(f'Expected two levels in {args.patterns}.')
+    return args
+
+
+def main():
+    args = parse_args()
+    puzzle_pattern, problem_pattern = args.patterns
+    cases = [case
+             for case in find_cases()
+             if re.match(puzzle_pattern, case.puzzle, re.IGNORECASE) and
+             re.match(problem_pattern, case.problem, re.IGNORECASE)]
+    with open(args.output, 'w') as results_file:
+        writer = DictWriter(results_file, RESULT_COLUMNS)
+        writer.writeheader()
+        # Replace each worker after one task, to measure its peak memory.
+        with ProcessPoolExecutor(1, max_tasks_per_child=1) as executor:
+            for case in cases:
+                result = executor.submit(run_case,
+                                         case,
+                                         args.size_limit).result()
+                writer.writerow(result)
+                results_file.flush()
+                print(f"{result['puzzle']} {result['problem']}: "
+                      f"{result['states']} states in {result['seconds']}s, "
+                      f"{result['states_per_second']}/s, "
+                      f"{result['peak_memory_mb']}MB")
+    print(f'Wrote {len(cases)} results to {args.output}.')
+
+
+def find_cases() -> typing.Iterator[BenchmarkCase]:
+    """ Find the problem diagrams in all the rules files. """
+    for rules_name in ('rules.md', 'new_rules.md', 'dominosa.md'):
+        rules_text = (RULES_FOLDER / rules_name).read_text()
+        puzzle = problem = ''
+        if rules_name == 'dominosa.md':
+            puzzle = 'Dominosa'  # Only one puzzle, so no section headings.
+        for state in parse(rules_text):
+            if state.style == Styles.Heading2:
+                puzzle = state.text
+            elif state.style == Styles.Heading + '4':
+                problem = state.text
+            elif state.style.startswith(Styles.Heading):
+                problem = ''
+            elif (state.style == Styles.Diagram and
+                  problem.startswith('Problem') and
+                  puzzle in SEARCH_BUILDERS):
+                yield BenchmarkCase(puzzle, problem, state.text)
+
+
+def build_capturing(start: str) -> typing.Tuple[BoardGraph, Board]:
+    return CaptureBoardGraph(), Board.create(start)
+
+
+def build_unmatched(start: str) -> typing.Tuple[BoardGraph, Board]:
+    # Walks the whole graph, because the blocking search has no goal.
+    return BlockingBoardGraph(), Board.create(start)
+
+
+def build_adding(start: str) -> typing.Tuple[BoardGraph, Board]:
+    # The problems only show the queue.
+    return AddingBoardGraph(), QueuedBoard.create('===\n' + start)
+
+
+def build_mirror(start: str) -> typing.Tuple[BoardGraph, Board]:
+    return MirrorGraph(), Board.create(start, max_pips=6)
+
+
+def build_bees(start: str) -> typing.Tuple[BoardGraph, Board]:
+    # Only the last round, with all the dice.
+    board = BeesBoard.create(start)
+    board.place_dice(board.queen_pips)
+    return BeesGraph(), board
+
+
+def build_drivers(start: str) -> typing.Tuple[BoardGraph, Board]:
+    return DriversGraph(), DriversBoard.create(start)
+
+
+def build_dominosa(start: str) -> typing.Tuple[BoardGraph, Board]:
+    board = DominosaBoard.create(start)
+    board.max_pips = board.width - 2
+    return DominosaGraph(move_weights=LEVEL_WEIGHTS['tricky']), board
+
+
+SEARCH_BUILDERS = {'Unmatched Donimoes': build_unmatched,
+                   'Capturing Donimoes': build_capturing,
+                   'Mirror Donimoes': build_mirror,
+                   'Bee Donimoes': build_bees,
+                   'Donimo Drivers': build_drivers,
+                   'Adding Donimoes': build_adding,
+                   'Dominosa': build_dominosa}
+
+
+def run_case(case: BenchmarkCase, size_limit: int) -> dict:
+    graph, board = SEARCH_BUILDERS[case.puzzle](case.start)
+    start_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start_time = perf_counter()
+    is_limited = False
+    try:
+        graph.walk(board, size_limit=size_limit)
+    except GraphLimitExceeded:
+        is_limited = True
+    seconds = perf_counter() - start_time
+    end_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    state_count = len(graph.graph)
+    return dict(puzzle=case.puzzle,
+                problem=case.problem,
+                graph=type(graph).__name__,
+                states=state_count,
+                is_limited=is_limited,
+                is_solved=graph.last is not None,
+                seconds=round(seconds, 3),
+                states_per_second=round(state_count / seconds),
+                peak_memory_mb=round((end_memory - start_memory) / 1024, 1))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,18 @@
+import atexit
 import math
+import os
+import pickle
 import re
 import typing
 from operator import itemgetter
-from collections import defaultdict, deque
+from collections import defaultdict, deque, OrderedDict
 from concurrent.futures import Future
 from concurrent.futures.process import ProcessPoolExecutor
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from functools import partial
-from itertools import chain
+from functools import lru_cache, partial
+from hashlib import blake2b
+from itertools import chain, count
 from multiprocessing import Pool, Manager
 from queue import Empty
 from random import Random
@@ -22,6 +26,8 @@ import matplotlib
 from networkx.classes.digraph import DiGraph
 from networkx.algorithms.shortest_paths.generic import shortest_path
 import numpy as np
+from adjacency_graph import AdjacencyGraph
+from event_log import EventLog
 import hall_of_fame
 
 # Avoid loading Tkinter back end when we won't use it.
@@ -31,14 +37,87 @@ matplotlib.use('Agg')
 import matplotlib.pyplot as plt  # @IgnorePep8
 
 
+# Board state hashes are calculated modulo this prime.
+STATE_HASH_MODULUS = (1 << 61) - 1
+
+# Key sets for Board.get_state_hash(). The check keys give a second hash
+# that's independent of the first one, see BoardGraph.describe_state().
+HASH_KEYS = 0
+CHECK_KEYS = 1
+
+
+@lru_cache(maxsize=None)
+def get_hash_key(*parts) -> int:
+    """ Make a repeatable random number for hashing part of a board state.
+
+    The same parts always give the same key, even in other processes.
+    """
+    digest = blake2b(repr(parts).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % STATE_HASH_MODULUS
+
+
+@lru_cache(maxsize=None)
+def get_position_key(x: int, y: int, key_set: int = HASH_KEYS) -> int:
+    """ Multiplier for a piece's key at position x, y.
+
+    Moving everything by dx, dy multiplies the hash by
+    get_position_key(dx, dy), so a cropped board can be hashed relative to
+    its corner. Negative positions divide.
+    """
+    return (pow(get_hash_key(key_set, 'x'), x, STATE_HASH_MODULUS) *
+            pow(get_hash_key(key_set, 'y'), y, STATE_HASH_MODULUS) %
+            STATE_HASH_MODULUS)
+
+
+@lru_cache(maxsize=None)
+def get_cell_key(pips: int,
+                 x: int,
+                 y: int,
+                 key_set: int = HASH_KEYS) -> int:
+    return (get_hash_key(key_set, 'cell', pips) *
+            get_position_key(x, y, key_set))
+
+
+@lru_cache(maxsize=None)
+def get_joint_key(is_horizontal: bool,
+                  x: int,
+                  y: int,
+                  key_set: int = HASH_KEYS) -> int:
+    return (get_hash_key(key_set, 'joint', is_horizontal) *
+            get_position_key(x, y, key_set))
+
+
+@lru_cache(maxsize=None)
+def get_board_cells(width: int, height: int) -> int:
+    """ Bitmask of all the cells on a board, laid out like Board.occupied. """
+    stride = width + 1
+    row = (1 << width) - 1
+    return sum(row << y*stride for y in range(height))
+
+
+def remove_item(items: list, item):
+    """ Remove an item from a list, looking for the same object first.
+
+    That avoids calling Domino.__eq__() on all the entries before it, and
+    an equal object only gets removed if the same one isn't there.
+    """
+    try:
+        index = list(map(id, items)).index(id(item))
+    except ValueError:
+        items.remove(item)
+    else:
+        del items[index]
+
+
 class Cell(object):
+    __slots__ = ('pips', 'domino', 'board', 'x', 'y')
+
     def __init__(self, pips):
         self.pips = pips
         self.domino = None
         self.board = None
         self.x = None
         self.y = None
-        self.visited = False
 
     def __repr__(self):
         return 'Cell({})'.format(self.pips)
@@ -278,11 +357,23 @@ class Board(object):
         for _ in range(width):
             self.cells.append([None] * height)
 
+        # Bit y*(width+1) + x is set when that cell is occupied. The extra
+        # bit on each row stays clear, so shifting left or right doesn't
+        # wrap around to the next row.
+        self.occupied = 0
+
+        # Sums of keys for cells and domino joints, see get_state_hash().
+        self.cells_hash = 0
+        self.cells_check = 0  # With CHECK_KEYS.
+
         # Track dominoes that aren't on the regular grid.
         self.offset_dominoes = []  # [(domino, x, y)]
         self.markers = {}
         self.cycles_remaining = 0
 
+        # Cells that mutate() refilled, laid out like self.occupied.
+        self.mutated_cells = 0
+
     def __eq__(self, other):
         for x in range(self.width):
             for y in range(self.height):
@@ -299,32 +390,94 @@ class Board(object):
         return not (self == other)
 
     def add(self, item: typing.Union['Domino', Cell], x: int, y: int):
-        try:
+        if isinstance(item, Domino):
             dx, dy = item.direction
             self.add(item.head, x, y)
             try:
                 self.add(item.tail, x+dx, y+dy)
             except BadPositionError:
-                # noinspection PyTypeChecker
                 self.remove(item.head)
                 raise
             self.dominoes.append(item)
+            self.hash_joint(item)
             if self.extra_dominoes:
-                self.extra_dominoes.remove(item)
-        except AttributeError:
-            if item.x is not None:
-                # noinspection PyTypeChecker
-                self.cells[item.x][item.y] = None
-            if not (0 <= x < self.width and 0 <= y < self.height):
-                raise BadPositionError(
-                    'Position {}, {} is off the board.'.format(x, y))
-            if self.cells[x][y] is not None:
-                raise BadPositionError(
-                    'Position {}, {} is occupied.'.format(x, y))
-            self.cells[x][y] = item
-            item.board = self
-            item.x = x
-            item.y = y
+                remove_item(self.extra_dominoes, item)
+            return
+        stride = self.width + 1
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            raise BadPositionError(
+                'Position {}, {} is off the board.'.format(x, y))
+        column = self.cells[x]
+        if column[y] is not None and column[y] is not item:
+            raise BadPositionError(
+                'Position {}, {} is occupied.'.format(x, y))
+        # Only leave the old position once the new one is known to be free,
+        # so a bad move doesn't change the board or its state hash.
+        if item.x is not None:
+            self.cells[item.x][item.y] = None
+            self.occupied &= ~(1 << (item.y*stride + item.x))
+            self.hash_cell(item, -1)
+        column[y] = item
+        self.occupied |= 1 << (y*stride + x)
+        item.board = self
+        item.x = x
+        item.y = y
+        self.hash_cell(item)
+
+    def hash_cell(self, cell: Cell, sign: int = 1):
+        """ Add a cell's key to the state hash, or remove it if sign is -1.
+
+        The sum isn't reduced by the modulus until get_state_hash().
+        """
+        pips = cell.pips
+        x = cell.x
+        y = cell.y
+        self.cells_hash += sign*get_cell_key(pips, x, y)
+        self.cells_check += sign*get_cell_key(pips, x, y, CHECK_KEYS)
+
+    def hash_joint(self, domino: 'Domino', sign: int = 1):
+        """ Add the key for the joint between a domino's cells. """
+        head = domino.head
+        tail = domino.tail
+        is_horizontal = head.y == tail.y
+        x = min(head.x, tail.x)
+        y = min(head.y, tail.y)
+        self.cells_hash += sign*get_joint_key(is_horizontal, x, y)
+        self.cells_check += sign*get_joint_key(is_horizontal, x, y, CHECK_KEYS)
+
+    def get_state_hash(self, cropped=False, key_set=HASH_KEYS) -> int:
+        """ Hash the board state, without building the display.
+
+        Boards with the same display(cropped) have the same hash, and
+        different boards rarely do. Subclasses that add anything but
+        dice and markers to the display shouldn't use this. The cells and
+        domino joints are tracked as they change, and the markers and dice
+        are added here, because there are only a few.
+        :param cropped: hash display(cropped=True) instead of the full board
+        :param key_set: HASH_KEYS, or CHECK_KEYS for an independent hash
+        """
+        xmin, _, ymin, _ = self.get_bounds(cropped)
+        modulus = STATE_HASH_MODULUS
+        if key_set == HASH_KEYS:
+            state_hash = self.cells_hash
+        else:
+            state_hash = self.cells_check
+        for (x, y), marker in self.markers.items():
+            state_hash += (get_hash_key(key_set, 'marker', marker) *
+                           get_position_key(x, y, key_set))
+        if self.dice_set is not None:
+            # Dice with matching pips are listed in the order they were added.
+            sorted_dice = sorted(self.dice_set.items(), key=itemgetter(1))
+            for i, ((x, y), pips) in enumerate(sorted_dice):
+                state_hash += (get_hash_key(key_set, 'die', i, pips) *
+                               get_position_key(x, y, key_set))
+        state_hash = (state_hash % modulus *
+                      get_position_key(-xmin, -ymin, key_set))
+        if self.dice_set is not None:
+            state_hash += get_hash_key(key_set, 'dice')
+        if not cropped:
+            state_hash += get_hash_key(key_set, 'size', self.width, self.height)
+        return state_hash % modulus
 
     def get_joint(self,
                   x1: int,
@@ -375,23 +528,27 @@ class Board(object):
         return joint
 
     def remove(self, item):
-        try:
+        if isinstance(item, Domino):
+            self.hash_joint(item, -1)
             self.remove(item.head)
             self.remove(item.tail)
-            self.dominoes.remove(item)
+            remove_item(self.dominoes, item)
             self.extra_dominoes.append(item)
-        except AttributeError:
-            # noinspection PyTypeChecker
-            self.cells[item.x][item.y] = None
-            item.x = item.y = item.board = None
+            return
+        self.cells[item.x][item.y] = None
+        self.occupied &= ~(1 << (item.y*(self.width+1) + item.x))
+        self.hash_cell(item, -1)
+        item.x = item.y = item.board = None
 
     def join(self, cell1, cell2):
         domino = Domino(cell1, cell2)
         self.dominoes.append(domino)
+        self.hash_joint(domino)
         return domino
 
     def split(self, domino):
-        self.dominoes.remove(domino)
+        remove_item(self.dominoes, domino)
+        self.hash_joint(domino, -1)
         if self.max_pips is not None:
             self.extra_dominoes.append(domino)
         domino.head.domino = None
@@ -432,12 +589,34 @@ class Board(object):
                 if domino not in removed:
                     i = new_board.extra_dominoes.index(domino)
                     new_domino = new_board.extra_dominoes[i]
-                    new_domino.rotate_to(domino.degrees)
-                    new_board.add(new_domino, domino.head.x, domino.head.y)
+                    head = domino.head
+                    if new_domino.head.pips == head.pips:
+                        new_domino.rotate_to(domino.degrees)
+                    else:
+                        # Keep the pips where they were.
+                        head = domino.tail
+                        new_domino.rotate_to((domino.degrees + 180) % 360)
+                    new_board.add(new_domino, head.x, head.y)
+            new_board.mutated_cells = (
+                get_board_cells(self.width, self.height) & ~new_board.occupied)
             is_successful = new_board.fill(random,
                                            matches_allowed=matches_allowed)
         return new_board
 
+    def has_same_pips(self, other: 'Board', cells: int) -> bool:
+        """ Check that the pips match another board in some cells.
+
+        :param cells: bitmask of the cells to check, like self.occupied
+        """
+        stride = self.width + 1
+        while cells:
+            cell = cells & -cells
+            cells ^= cell
+            y, x = divmod(cell.bit_length() - 1, stride)
+            if self[x][y].pips != other[x][y].pips:
+                return False
+        return True
+
     @staticmethod
     def pick_mutation_count(max_mutations, random):
         n = random.randint(1, (max_mutations + 1) * max_mutations // 2)
@@ -472,22 +651,23 @@ class Board(object):
         are_markers_unique = not marker_display.startswith('(')
         display = [[' '] * (width*2-1) for _ in range(height*2-1)]
 
-        for y in range(height):
-            for x in range(width):
-                row = (height - y - 1)*2
-                col = x*2
-                cell = self[x+xmin][y+ymin]
-                cell_display = self.display_cell(cell,
-                                                 x+xmin,
-                                                 y+ymin,
-                                                 are_markers_unique)
-                display[row][col] = cell_display
-                if (cell is not None and
-                        cell.domino is not None and
-                        cell.domino.head == cell):
-                    dx, dy = cell.domino.direction
-                    divider = '|' if dx else '-'
-                    display[row-dy][col+dx] = divider
+        markers = self.markers if are_markers_unique else {}
+        for x in range(xmin, xmax+1):
+            column = self.cells[x]
+            col = (x-xmin)*2
+            for y in range(ymin, ymax+1):
+                row = (ymax-y)*2
+                cell = column[y]
+                if cell is None:
+                    cell_display = 'x'
+                else:
+                    cell_display = str(cell.pips)
+                    domino = cell.domino
+                    if domino is not None and domino.head is cell:
+                        dx, dy = domino.direction
+                        divider = '|' if dx else '-'
+                        display[row-dy][col+dx] = divider
+                display[row][col] = markers.get((x, y), cell_display)
         self.adjust_display(display)
         main_display = ''.join(''.join(row).rstrip() + '\n' for row in display)
         if marker_display:
@@ -516,35 +696,117 @@ class Board(object):
                 marker_display += f'{name}{pips}'
         return marker_display
 
-    def display_cell(self, cell, x, y, are_markers_unique):
-        if cell is None:
-            display = 'x'
-        else:
-            display = str(cell.pips)
-        if are_markers_unique:
-            return self.markers.get((x, y), display)
-        return display
-
     def adjust_display(self, display: typing.List[typing.List[str]]):
         """ Adjust the display grid before it gets assembled. """
 
+    def crop(self, border: int = 0) -> 'Board':
+        """ Copy the cropped part of the board, and add a border around it.
+
+        The copy matches what create() builds from display(cropped=True),
+        including the order of dominoes, markers, and dice, but it skips
+        writing and parsing the text. Subclasses with extra state need to
+        copy it.
+        """
+        xmin, xmax, ymin, ymax = self.get_bounds(cropped=True)
+        dx = border - xmin
+        dy = border - ymin
+        dice_set = None
+        if self.dice_set is not None:
+            dice_set = DiceSet()
+            for (x, y), pips in sorted(self.dice_set.items(),
+                                       key=itemgetter(1)):
+                dice_set.dice[x+dx, y+dy] = pips
+        # Leave out max_pips until the end, so the board doesn't create a
+        # full set of extra dominoes and remove each domino as it's added.
+        board = self.__class__(xmax - xmin + 1 + 2*border,
+                               ymax - ymin + 1 + 2*border,
+                               dice_set=dice_set)
+        markers = board.markers
+        for x in range(xmin, xmax+1):
+            for y in range(ymin, ymax+1):
+                marker = self.markers.get((x, y))
+                if marker is not None:
+                    markers[x+dx, y+dy] = marker
+                cell = self[x][y]
+                if cell is None:
+                    continue
+                if cell.domino is None:
+                    board.add(Cell(cell.pips), x+dx, y+dy)
+                    continue
+                partner = cell.partner
+                if partner.x < x or partner.y < y:
+                    # Already added from the partner cell.
+                    continue
+                domino = Domino(cell.pips, partner.pips)
+                if partner.y > y:
+                    domino.rotate(90)
+                board.add(domino, x+dx, y+dy)
+                marker = self.markers.get((partner.x, partner.y))
+                if marker is not None:
+                    markers[partner.x+dx, partner.y+dy] = marker
+        if len(set(markers.values())) != len(markers):
+            # Markers are listed by name when they aren't unique.
+            board.markers = dict(sorted(markers.items(), key=itemgetter(1, 0)))
+        board.max_pips = self.max_pips
+        board.extra_dominoes = [Domino(domino.head.pips, domino.tail.pips)
+                                for domino in self.extra_dominoes]
+        return board
+
+    def apply_delta(self, delta, reverse=False):
+        """ Move pieces around the board, as described by a move delta.
+
+        :param delta: ((kind, x, y, dx, dy), ...) where kind is 'domino',
+            'marker', or 'die', x and y are the starting position of the piece,
+            or a domino's head, and dx and dy are how far it moves.
+        :param reverse: True if the pieces should be moved back to where
+            they started.
+        """
+        if reverse:
+            delta = [(kind, x+dx, y+dy, -dx, -dy)
+                     for kind, x, y, dx, dy in delta]
+        # Lift all the pieces before placing any, in case they trade places.
+        pieces = []
+        for kind, x, y, dx, dy in delta:
+            if kind == 'domino':
+                piece = self[x][y].domino
+                self.remove(piece)
+            elif kind == 'marker':
+                piece = self.markers.pop((x, y))
+            else:
+                piece = self.dice_set.dice.pop((x, y))
+            pieces.append(piece)
+        for (kind, x, y, dx, dy), piece in zip(delta, pieces):
+            if kind == 'domino':
+                self.add(piece, x+dx, y+dy)
+            elif kind == 'marker':
+                self.markers[x+dx, y+dy] = piece
+            else:
+                self.dice_set.dice[x+dx, y+dy] = piece
+
     def get_bounds(self, cropped):
         if not cropped:
             xmin = ymin = 0
             xmax, ymax = self.width - 1, self.height - 1
         else:
-            xmin = self.width + 1
-            ymin = self.height + 1
-            xmax = ymax = 0
-            positions = chain(((cell.x, cell.y)
-                               for domino in self.dominoes
-                               for cell in (domino.head, domino.tail)),
-                              self.markers)
-            for x, y in positions:
-                xmin = min(xmin, x)
-                xmax = max(xmax, x)
-                ymin = min(ymin, y)
-                ymax = max(ymax, y)
+            xs = []
+            ys = []
+            for domino in self.dominoes:
+                head = domino.head
+                tail = domino.tail
+                xs.append(head.x)
+                xs.append(tail.x)
+                ys.append(head.y)
+                ys.append(tail.y)
+            for x, y in self.markers:
+                xs.append(x)
+                ys.append(y)
+            if xs:
+                xmin, xmax = min(xs), max(xs)
+                ymin, ymax = min(ys), max(ys)
+            else:
+                xmin = self.width + 1
+                ymin = self.height + 1
+                xmax = ymax = 0
         return xmin, xmax, ymin, ymax
 
     def choose_extra_dominoes(self, random):
@@ -583,14 +845,12 @@ class Board(object):
         """
         if reset_cycles:
             self.cycles_remaining = 10000
-        for y in range(self.height):
-            for x in range(self.width):
-                if self[x][y] is None:
-                    return self.fill_space(x,
-                                           y,
-                                           random,
-                                           matches_allowed)
-        return True
+        empty = get_board_cells(self.width, self.height) & ~self.occupied
+        if not empty:
+            return True
+        # The lowest bit is the first empty cell, scanning rows from the bottom.
+        y, x = divmod((empty & -empty).bit_length() - 1, self.width + 1)
+        return self.fill_space(x, y, random, matches_allowed)
 
     def fill_space(self, x, y, random, matches_allowed):
         """ Try all possible dominoes and positions starting at x, y. """
@@ -626,28 +886,60 @@ class Board(object):
             rotation = (rotation + 90) % 360
         return False
 
-    def visit_connected(self, cell):
-        cell.visited = True
-        for dx, dy in Domino.directions:
-            x = cell.x + dx
-            y = cell.y + dy
-            if 0 <= x < self.width and 0 <= y < self.height:
-                neighbour = self[x][y]
-                if neighbour is not None and not neighbour.visited:
-                    self.visit_connected(neighbour)
+    def spread(self, cells: int) -> int:
+        """ Add each cell's neighbours to a bitmask of cells. """
+        stride = self.width + 1
+        return (cells | cells << 1 | cells >> 1 |
+                cells << stride | cells >> stride)
 
-    def is_connected(self):
-        domino = None
+    def get_domino_masks(self) -> typing.Tuple[int, int, int, dict]:
+        """ Build bitmasks of the dominoes, laid out like self.occupied.
+
+        :return: (domino_cells, right_links, up_links, pip_cells) where
+            domino_cells has the cells covered by dominoes, right_links has
+            the left cell of each horizontal domino, up_links has the lower
+            cell of each vertical domino, and pip_cells is
+            {pips: domino cells with those pips}.
+        """
+        stride = self.width + 1
+        domino_cells = right_links = up_links = 0
+        pip_cells = defaultdict(int)
         for domino in self.dominoes:
-            domino.head.visited = False
-            domino.tail.visited = False
-        if domino is None:
-            return True
+            head = domino.head
+            tail = domino.tail
+            head_bit = 1 << (head.y*stride + head.x)
+            tail_bit = 1 << (tail.y*stride + tail.x)
+            domino_cells |= head_bit | tail_bit
+            pip_cells[head.pips] |= head_bit
+            pip_cells[tail.pips] |= tail_bit
+            if head.y == tail.y:
+                right_links |= min(head_bit, tail_bit)
+            else:
+                up_links |= min(head_bit, tail_bit)
+        return domino_cells, right_links, up_links, pip_cells
 
-        self.visit_connected(domino.head)
+    def is_connected(self):
+        """ Check that all the dominoes are in one group.
 
-        return all(domino.head.visited and domino.tail.visited
-                   for domino in self.dominoes)
+        Flood fills a bitmask of occupied cells, instead of visiting cells.
+        """
+        dominoes = self.dominoes
+        if not dominoes:
+            return True
+        occupied = self.occupied
+        stride = self.width + 1
+        head = dominoes[0].head
+        connected = 1 << (head.y*stride + head.x)
+        while True:
+            spread = (connected | connected << 1 | connected >> 1 |
+                      connected << stride | connected >> stride) & occupied
+            if spread == connected:
+                break
+            connected = spread
+        if connected == occupied:
+            return True
+        domino_cells = self.get_domino_masks()[0]
+        return connected & domino_cells == domino_cells
 
     @property
     def are_markers_connected(self):
@@ -685,20 +977,39 @@ class Board(object):
         return (max_x - min_x + 1) * (max_y - min_y + 1)
 
     def has_loner(self):
+        """ Check for a domino with no neighbours that share a number. """
+        stride = self.width + 1
+        occupied = self.occupied
+        _, right_links, up_links, pip_cells = self.get_domino_masks()
+        matching_cells = {}  # {pips: cells in dominoes with those pips}
+        for pips, cells in pip_cells.items():
+            matching_cells[pips] = (cells |
+                                    (cells & right_links) << 1 |
+                                    (cells >> 1) & right_links |
+                                    (cells & up_links) << stride |
+                                    (cells >> stride) & up_links)
         for domino in self.dominoes:
-            neighbours = domino.find_neighbours()
-            has_matching_neighbour = any(domino.isMatch(neighbour)
-                                         for neighbour in neighbours)
-            if not has_matching_neighbour:
+            head = domino.head
+            tail = domino.tail
+            cells = (1 << (head.y*stride + head.x) |
+                     1 << (tail.y*stride + tail.x))
+            neighbours = self.spread(cells) & occupied & ~cells
+            if not neighbours & (matching_cells[head.pips] |
+                                 matching_cells[tail.pips]):
                 return True
         return False
 
     def hasMatch(self):
-        for domino in self.dominoes:
-            for cell in (domino.head, domino.tail):
-                for neighbour in cell.find_neighbours():
-                    if neighbour.pips == cell.pips:
-                        return True
+        """ Check for a domino cell next to the same number. """
+        domino_cells, right_links, up_links, pip_cells = self.get_domino_masks()
+        if domino_cells != self.occupied:
+            # Some cells aren't in dominoes, so check them the slow way.
+            return any(domino.hasMatch() for domino in self.dominoes)
+        stride = self.width + 1
+        for cells in pip_cells.values():
+            if (cells & cells >> 1 & ~right_links or
+                    cells & cells >> stride & ~up_links):
+                return True
         return False
 
     def findMatches(self):
@@ -710,29 +1021,28 @@ class Board(object):
         return [matches[coord] for coord in match_coordinates]
 
     def hasEvenGaps(self):
-        empty_spaces = set()
-        to_visit = set()
-        for y in range(self.height):
-            for x in range(self.width):
-                if self[x][y] is None:
-                    empty_spaces.add((x, y))
-        while empty_spaces:
-            if len(empty_spaces) % 2 != 0:
+        """ Check that each group of empty cells could hold whole dominoes.
+
+        Flood fills bitmasks of the empty cells, like is_connected().
+        """
+        stride = self.width + 1
+        empty = get_board_cells(self.width, self.height) & ~self.occupied
+        while empty:
+            gap = empty & -empty
+            while True:
+                spread = (gap | gap << 1 | gap >> 1 |
+                          gap << stride | gap >> stride) & empty
+                if spread == gap:
+                    break
+                gap = spread
+            if gap.bit_count() % 2 != 0:
                 return False
-            to_visit.add(empty_spaces.pop())
-            while to_visit:
-                x, y = to_visit.pop()
-                for dx, dy in Domino.directions:
-                    neighbour = (x+dx, y+dy)
-                    try:
-                        empty_spaces.remove(neighbour)
-                        to_visit.add(neighbour)
-                    except KeyError:
-                        pass
+            empty ^= gap
         return True
 
 
 class Domino(object):
+    __slots__ = ('head', 'tail', 'degrees', 'direction')
     directions = [(1, 0), (0, 1), (-1, 0), (0, -1)]
     direction_names = 'ruld'
     alignment_names = 'hvhv'
@@ -755,7 +1065,7 @@ class Domino(object):
         return Domino.directions[index]
 
     def __init__(self, head, tail):
-        if hasattr(head, 'domino'):
+        if isinstance(head, Cell):
             self.check_available(head)
             self.check_available(tail)
             self.head = head
@@ -772,8 +1082,7 @@ class Domino(object):
             self.head = Cell(head)
             self.tail = Cell(tail)
             self.degrees = 0  # 0, 90, 180, or 270
-            self.direction = None
-            self.calculateDirection()
+            self.direction = self.directions[0]
         self.head.domino = self
         self.tail.domino = self
 
@@ -788,10 +1097,14 @@ class Domino(object):
     def __eq__(self, other):
         if not isinstance(other, Domino):
             return False
-        return ((self.head.pips == other.head.pips and
-                 self.tail.pips == other.tail.pips) or
-                (self.head.pips == other.tail.pips and
-                 self.tail.pips == other.head.pips))
+        head_pips = self.head.pips
+        tail_pips = self.tail.pips
+        other_head_pips = other.head.pips
+        other_tail_pips = other.tail.pips
+        return ((head_pips == other_head_pips and
+                 tail_pips == other_tail_pips) or
+                (head_pips == other_tail_pips and
+                 tail_pips == other_head_pips))
 
     def __ne__(self, other):
         return not (self == other)
@@ -806,11 +1119,23 @@ class Domino(object):
         self.rotate_to((self.degrees + degrees) % 360)
 
     def rotate_to(self, degrees):
+        board = self.head.board
+        old_degrees = self.degrees
+        if board:
+            board.hash_joint(self, -1)
         self.degrees = degrees
         self.calculateDirection()
-        if self.head.board:
+        if board:
             dx, dy = self.direction
-            self.head.board.add(self.tail, self.head.x+dx, self.head.y+dy)
+            try:
+                board.add(self.tail, self.head.x+dx, self.head.y+dy)
+            except BadPositionError:
+                # The tail didn't move, so put the joint back where it was.
+                self.degrees = old_degrees
+                self.calculateDirection()
+                board.hash_joint(self)
+                raise
+            board.hash_joint(self)
 
     def move(self, dx, dy):
         x = self.head.x
@@ -930,35 +1255,210 @@ class MoveDescription:
     # Similar to heuristic, but doesn't control search. Zero iff new_state is solved.
     remaining: float = 0
 
+    # Pieces that moved: ((kind, x, y, dx, dy), ...), see Board.apply_delta().
+    delta: tuple = field(default=None, compare=False)
+
 
 @dataclass
 class MoveRequest:
-    start_state: str
+    start_state: typing.Hashable
     future: Future
 
 
+class StateCodec:
+    """ Convert between board display text and the keys stored in a graph.
+
+    This default codec stores the display text unchanged.
+    """
+    def encode(self, state: str) -> typing.Hashable:
+        return state
+
+    def decode(self, key: typing.Hashable) -> str:
+        return key
+
+
+class PackedStateCodec(StateCodec):
+    """ Pack display text into bytes, using about half a byte per character.
+
+    Blanks, line breaks, joints, and pips up to 6 get one hex digit each, and
+    'x' and '|' get two. Anything else gets an escape digit followed by its
+    character code. Escape digits sit between the digits of the common
+    characters, so packed states sort in the same order as their display
+    text, and the search still breaks ties the same way.
+    """
+    def __init__(self):
+        single_codes = {'\n': '2', ' ': '4', '-': '6', 'x': 'f2', '|': 'f4'}
+        single_codes.update((str(pips), f'{pips+8:x}') for pips in range(7))
+        # Escape codes for the characters that sort below each limit.
+        escapes = (('\n', '1'),
+                   (' ', '3'),
+                   ('-', '5'),
+                   ('0', '7'),
+                   ('x', 'f1'),
+                   ('|', 'f3'))
+        self.encoding = {}  # {char_code: packed_hex}
+        for char_code in range(128):
+            c = chr(char_code)
+            packed = single_codes.get(c)
+            if packed is None:
+                escape = next((escape
+                               for limit, escape in escapes
+                               if c < limit),
+                              'f5')
+                packed = f'{escape}{char_code:02x}'
+            self.encoding[char_code] = packed
+        self.decoding = {packed: chr(char_code)
+                         for char_code, packed in self.encoding.items()}
+        self.decoding['0'] = ''  # Padding to fill the last byte.
+        self.code_pattern = re.compile('f[135]..|f[24]|[1357]..|.')
+
+    def encode(self, state: str) -> bytes:
+        packed = state.translate(self.encoding)
+        if len(packed) % 2:
+            packed += '0'
+        return bytes.fromhex(packed)
+
+    def decode(self, key: bytes) -> str:
+        codes = self.code_pattern.findall(key.hex())
+        return ''.join(map(self.decoding.__getitem__, codes))
+
+
+# Worker processes that all graphs share, see get_worker_pool().
+worker_pool: typing.Optional[ProcessPoolExecutor] = None
+worker_pool_key: typing.Optional[tuple] = None  # (pid, size, walker_config)
+walk_ids = count()
+
+# Set in each worker process, see find_moves_in_worker().
+worker_config: typing.Optional[bytes] = None
+worker_walker: typing.Optional['BoardGraph'] = None
+worker_walk_id: typing.Optional[int] = None
+
+
+def get_worker_pool(walker: 'BoardGraph',
+                    process_count: int) -> ProcessPoolExecutor:
+    """ Start the shared pool of worker processes, or reuse the running one.
+
+    The walker is sent once to each worker when it starts, so the pool is
+    only restarted when a graph needs a different size or configuration.
+    :param walker: a clone of the graph, to expand states in the workers
+    :param process_count: number of worker processes
+    """
+    global worker_pool, worker_pool_key
+    walker_config = pickle.dumps(walker)
+    key = (os.getpid(), process_count, walker_config)
+    if worker_pool_key == key:
+        return worker_pool
+    if worker_pool_key is not None and worker_pool_key[0] == os.getpid():
+        worker_pool.shutdown()
+    # A pool inherited from a parent process can't be used or shut down.
+    worker_pool = ProcessPoolExecutor(process_count,
+                                      initializer=init_worker,
+                                      initargs=(walker_config,))
+    worker_pool_key = key
+    return worker_pool
+
+
+def shutdown_worker_pool():
+    """ Stop the shared worker processes, if they were started. """
+    global worker_pool, worker_pool_key
+    if worker_pool_key is not None and worker_pool_key[0] == os.getpid():
+        worker_pool.shutdown()
+    worker_pool = worker_pool_key = None
+
+
+atexit.register(shutdown_worker_pool)
+
+
+def init_worker(walker_config: bytes):
+    global worker_config
+    worker_config = walker_config
+
+
+def find_moves_in_worker(walk_id: int,
+                         states: typing.List[typing.Hashable],
+                         max_pips: int) -> typing.List[list]:
+    """ Expand states with the walker that was sent to this worker.
+
+    Each walk starts with a fresh copy of the walker, so caches and search
+    state from one walk never leak into the next.
+    """
+    global worker_walker, worker_walk_id
+    if walk_id != worker_walk_id:
+        worker_walker = pickle.loads(worker_config)
+        worker_walk_id = walk_id
+    return worker_walker.find_packed_moves(states, max_pips)
+
+
 class BoardGraph(object):
-    def __init__(self, board_class=Board, process_count: int = 0):
+    # Converts states to graph keys. Override with a PackedStateCodec to
+    # save memory on big searches.
+    state_codec = StateCodec()
+
+    # Number of expanded boards to keep, so a new state's board can be built
+    # by applying its move delta to its parent's board, instead of parsing
+    # display text. Only used when there are no worker processes.
+    board_cache_size = 0
+
+    # Class of the graph to store states and moves in. Override with
+    # AdjacencyGraph to save memory on big searches, and call its
+    # to_networkx() method when you need the full networkx interface.
+    graph_class = DiGraph
+
+    # Maximum number of states to expand at each depth, or None to search
+    # all states in A* order. A beam search keeps big searches small, but it
+    # can miss the shortest solution.
+    beam_width: typing.Optional[int] = None
+
+    # Number of new states to remember by Board.get_state_hash(), so a state
+    # that gets generated again skips display() and check_progress(). A hit
+    # must also match a second hash with independent keys, see
+    # describe_state().
+    known_state_count = 0
+
+    # Number of the best pending states to pop and expand together, when
+    # there are worker processes. Each worker gets its share of the batch in
+    # one task, and the moves are added in the same order as a walk without
+    # workers, see expand_batch(). Zero sends one state per task, with up to
+    # 2*process_count tasks waiting.
+    expansion_batch_size = 0
+
+    def __init__(self,
+                 board_class=Board,
+                 process_count: int = 0,
+                 executor: ProcessPoolExecutor = None):
+        """ Initialize.
+
+        :param board_class: the kind of board to load states into
+        :param process_count: number of worker processes to expand states
+        :param executor: a pool of process_count workers to use, or None to
+            use the shared pool from get_worker_pool() when process_count > 0
+        """
         self.graph = self.start = self.last = self.closest = None
+        # {key: (parent_key, delta)} while the parent board is cached
+        self.parent_moves = None
+        self.expanded_boards = OrderedDict()  # {key: board}, oldest first
+        # {state_hash: (state_check, display, progress)}
+        self.known_states = OrderedDict()
         self.min_remaining = None  # Minimum steps remaining to find a solution.
         self.board_class = board_class
         self.process_count = process_count
-        if process_count > 0:
-            self.executor = ProcessPoolExecutor(process_count)
-        else:
-            self.executor: typing.Optional[ProcessPoolExecutor] = None
+        self.executor = executor
         self.closest = None
         self.is_debugging = False
 
     def walk(self, board, size_limit=maxsize) -> typing.Set[str]:
-        self.graph = DiGraph()
+        self.graph = self.graph_class()
         self.start = board.display(cropped=True)
-        self.graph.add_node(self.start)
-
-        if self.executor is not None:
-            walker = self.clone()
+        start_key = self.state_codec.encode(self.start)
+        self.graph.add_node(start_key)
+        self.expanded_boards.clear()
+        self.known_states.clear()
+
+        submit = self.start_workers()
+        if submit is not None:
+            self.parent_moves = None
         else:
-            walker = None
+            self.parent_moves = {} if self.board_cache_size else None
 
         # len of shortest path known from start to a state.
         g_score = defaultdict(lambda: math.inf)
@@ -966,50 +1466,233 @@ class BoardGraph(object):
         max_pips = board.max_pips
 
         start_h = self.calculate_heuristic(board)
-        g_score[self.start] = 0
+        g_score[start_key] = 0
         pending_nodes = PriorityQueue()
-        pending_nodes.add(self.start, start_h)
+        pending_nodes.add(start_key, start_h)
+        if self.beam_width is not None:
+            self.search_beam(pending_nodes, g_score, max_pips, submit, size_limit)
+            return self.get_states()
         requests: typing.Deque[MoveRequest] = deque()
+        early_moves = {}  # {state: moves} expanded by expand_batch()
         while pending_nodes:
             if size_limit is not None and len(self.graph) >= size_limit:
                 raise GraphLimitExceeded(size_limit)
+            if submit is not None and self.expansion_batch_size:
+                self.expand_batch(pending_nodes,
+                                  g_score,
+                                  max_pips,
+                                  submit,
+                                  size_limit,
+                                  early_moves)
+                continue
             state = pending_nodes.pop()
-            if not self.executor:
+            if submit is None:
                 moves = self.find_moves(state, max_pips)
                 self.add_moves(state, moves, pending_nodes, g_score)
             else:
-                request = MoveRequest(
-                    state,
-                    self.executor.submit(walker.find_moves, state, max_pips))
+                request = MoveRequest(state, submit([state], max_pips))
                 requests.append(request)
                 while ((not pending_nodes and requests) or
                        len(requests) > 2*self.process_count):
                     request = requests.popleft()
                     state = request.start_state
-                    moves = request.future.result()
+                    [packed_moves] = request.future.result()
+                    moves = self.unpack_moves(packed_moves)
                     self.add_moves(state, moves, pending_nodes, g_score)
-        return set(self.graph.nodes())
+        return self.get_states()
+
+    def expand_batch(self,
+                     pending_nodes: PriorityQueue,
+                     g_score: typing.Dict[typing.Hashable, float],
+                     max_pips: int,
+                     submit: typing.Callable[..., Future],
+                     size_limit: int,
+                     early_moves: typing.Dict[typing.Hashable, list]):
+        """ Expand the best pending states together, in serial walk order.
+
+        Pops up to expansion_batch_size states, and expands the ones that
+        aren't in early_moves yet. Their moves are added one state at a
+        time, while the next state in the batch is still the one that
+        pending_nodes would pop. After that, the rest of the batch goes back
+        to pending_nodes, and keeps its moves in early_moves until it comes
+        up again. That way, the graph and the size_limit cutoff are exactly
+        the same as a walk without workers.
+        """
+        batch = []  # [(priority, state)]
+        while pending_nodes and len(batch) < self.expansion_batch_size:
+            batch.append(pending_nodes.peek())
+            pending_nodes.pop()
+        new_states = [state for _, state in batch if state not in early_moves]
+        if new_states:
+            early_moves.update(zip(new_states,
+                                   self.expand_states(new_states,
+                                                      max_pips,
+                                                      submit)))
+        for i, (priority, state) in enumerate(batch):
+            if i > 0:
+                if (state in pending_nodes or
+                        (pending_nodes and
+                         pending_nodes.peek() < (priority, state))):
+                    for later_priority, later_state in batch[i:]:
+                        if later_state not in pending_nodes:
+                            pending_nodes.add(later_state, later_priority)
+                    return
+                if size_limit is not None and len(self.graph) >= size_limit:
+                    raise GraphLimitExceeded(size_limit)
+            moves = early_moves.pop(state)
+            self.add_moves(state, moves, pending_nodes, g_score)
+
+    def search_beam(self,
+                    pending_nodes: PriorityQueue,
+                    g_score: typing.Dict[typing.Hashable, float],
+                    max_pips: int,
+                    submit: typing.Optional[typing.Callable[..., Future]],
+                    size_limit: int):
+        """ Expand the best beam_width states at each depth, drop the rest. """
+        while pending_nodes:
+            level = []
+            while pending_nodes and len(level) < self.beam_width:
+                level.append(pending_nodes.pop())
+            pending_nodes = PriorityQueue()
+            if submit is None:
+                level_moves = (self.find_moves(state, max_pips)
+                               for state in level)
+            else:
+                level_moves = self.expand_states(level, max_pips, submit)
+            for state, moves in zip(level, level_moves):
+                if size_limit is not None and len(self.graph) >= size_limit:
+                    raise GraphLimitExceeded(size_limit)
+                self.add_moves(state, moves, pending_nodes, g_score)
+
+    def expand_states(
+            self,
+            states: typing.List[typing.Hashable],
+            max_pips: int,
+            submit: typing.Callable[..., Future]) -> typing.List[
+                typing.List[MoveDescription]]:
+        """ Expand states in worker processes, with one task per worker.
+
+        The states are dealt out in turn, so each worker gets a fair share
+        of the best ones.
+        :return: a list of moves for each state, in the same order
+        """
+        task_count = max(1, min(self.process_count, len(states)))
+        futures = [submit(states[i::task_count], max_pips)
+                   for i in range(task_count)]
+        task_moves = [future.result() for future in futures]
+        return [self.unpack_moves(task_moves[i % task_count][i // task_count])
+                for i in range(len(states))]
+
+    def start_workers(self) -> typing.Optional[typing.Callable[..., Future]]:
+        """ Choose how to expand states in worker processes.
+
+        :return: a function that takes ([state], max_pips) and returns a
+            future for find_packed_moves(), or None to expand states in this
+            process.
+        """
+        if self.executor is not None:
+            return partial(self.executor.submit,
+                           self.clone().find_packed_moves)
+        if self.process_count <= 0:
+            return None
+        pool = get_worker_pool(self.clone(), self.process_count)
+        return partial(pool.submit, find_moves_in_worker, next(walk_ids))
+
+    def get_states(self) -> typing.Set[str]:
+        """ Decode all the states in the graph back into display text. """
+        decode = self.state_codec.decode
+        return {decode(key) for key in self.graph.nodes()}
 
     def clone(self) -> 'BoardGraph':
         """ Create a smaller copy of this object to pass to worker process. """
         return self.__class__(self.board_class)
 
+    def find_packed_moves(
+            self,
+            states: typing.List[typing.Hashable],
+            max_pips: int) -> typing.List[typing.List[tuple]]:
+        """ Find moves for several states, packed to send between processes.
+
+        Tuples pickle smaller and faster than MoveDescription objects. The
+        deltas are left out, because the main process only applies them to
+        boards it expanded itself.
+        :return: a list of moves for each state, see unpack_moves()
+        """
+        return [[(description.move,
+                  description.new_state,
+                  description.edge_attrs,
+                  description.heuristic,
+                  description.remaining)
+                 for description in self.find_moves(state, max_pips)]
+                for state in states]
+
+    @staticmethod
+    def unpack_moves(
+            packed_moves: typing.List[tuple]) -> typing.List[MoveDescription]:
+        """ Convert moves from find_packed_moves() back into descriptions. """
+        return [MoveDescription(*packed_move) for packed_move in packed_moves]
+
     def find_moves(self, state, max_pips):
-        board = self.board_class.create(state, border=1, max_pips=max_pips)
+        board = self.load_board(state, max_pips)
         moves = list(self.generate_moves(board))
+        if self.parent_moves is not None:
+            self.expanded_boards[state] = board
+            if len(self.expanded_boards) > self.board_cache_size:
+                old_state, _ = self.expanded_boards.popitem(last=False)
+                self.forget_parent(old_state)
         return moves
 
+    def forget_parent(self, parent_state):
+        """ Drop the move deltas from a board that left the cache.
+
+        Without the parent board, the deltas can't be applied, so its
+        children will be parsed from their display text.
+        """
+        parent_moves = self.parent_moves
+        for child_state in self.graph[parent_state]:
+            parent_move = parent_moves.get(child_state)
+            if parent_move is not None and parent_move[0] == parent_state:
+                del parent_moves[child_state]
+
+    def load_board(self, state, max_pips) -> Board:
+        """ Build the board for a graph key.
+
+        If the parent board is still cached, apply the move delta to it and
+        crop a copy. Otherwise, parse the display text.
+        """
+        if self.parent_moves is not None:
+            parent_state, delta = self.parent_moves.pop(state, (None, None))
+            parent_board = self.expanded_boards.get(parent_state)
+            if parent_board is not None:
+                self.expanded_boards.move_to_end(parent_state)
+                parent_board.apply_delta(delta)
+                try:
+                    return parent_board.crop(border=1)
+                finally:
+                    parent_board.apply_delta(delta, reverse=True)
+        return self.board_class.create(self.state_codec.decode(state),
+                                       border=1,
+                                       max_pips=max_pips)
+
     def add_moves(self,
-                  start_state: str,
+                  start_state: typing.Hashable,
                   moves: typing.Iterable[MoveDescription],
                   pending_nodes: PriorityQueue,
-                  g_score: typing.Dict[str, float]):
+                  g_score: typing.Dict[typing.Hashable, float]):
+        """ Add moves to the graph.
+
+        :param start_state: the graph key for the state the moves start from
+        :param moves: the moves to add, with new states as display text
+        :param pending_nodes: keys of states that still need to be explored
+        :param g_score: shortest known path length to each key
+        """
         state_g_score = g_score[start_state]
+        encode = self.state_codec.encode
         for description in moves:
             edge_attrs = description.edge_attrs or {}
 
             new_g_score = state_g_score + 1
-            new_state = description.new_state
+            new_state = encode(description.new_state)
             known_g_score = g_score[new_state]
             if not self.graph.has_node(new_state):
                 # new node
@@ -1017,11 +1700,15 @@ class BoardGraph(object):
                 is_improved = True
                 if self.is_debugging:
                     if description.heuristic == 0:
-                        print(new_state)
+                        print(description.new_state)
             else:
                 is_improved = new_g_score < known_g_score
             if is_improved:
                 g_score[new_state] = new_g_score
+                if (self.parent_moves is not None and
+                        description.delta is not None):
+                    self.parent_moves[new_state] = (start_state,
+                                                    description.delta)
                 f = new_g_score + description.heuristic
 
                 pending_nodes.add(new_state, f)
@@ -1029,7 +1716,7 @@ class BoardGraph(object):
                                 new_state,
                                 move=description.move,
                                 **edge_attrs)
-            self.check_remaining(description.remaining, new_state)
+            self.check_remaining(description.remaining, description.new_state)
 
     def check_remaining(self, remaining: float, new_state: str):
         if self.min_remaining is None or remaining < self.min_remaining:
@@ -1055,6 +1742,40 @@ class BoardGraph(object):
         domino_count = len(dominoes)
         return domino_count
 
+    def describe_state(
+            self,
+            board: Board,
+            cropped: bool = True,
+            display: typing.Callable[[], str] = None) -> typing.Tuple[str, float]:
+        """ Display a new board state, and check its progress.
+
+        If the state was already described, look it up by its hash instead.
+        Building the display is what that saves, so a hit is confirmed with a
+        check value from CHECK_KEYS, not by comparing displays.
+        :param board: the new board state
+        :param cropped: passed to display() and get_state_hash()
+        :param display: builds the display faster than board.display()
+        :return: (display, progress)
+        """
+        if not self.known_state_count:
+            state_hash = None
+        else:
+            state_hash = board.get_state_hash(cropped)
+            state_check = board.get_state_hash(cropped, CHECK_KEYS)
+            known_state = self.known_states.get(state_hash)
+            if known_state is not None and known_state[0] == state_check:
+                return known_state[1:]
+        if display is None:
+            state = board.display(cropped=cropped)
+        else:
+            state = display()
+        known_state = state, self.check_progress(board)
+        if state_hash is not None:
+            self.known_states[state_hash] = (state_check, *known_state)
+            if len(self.known_states) > self.known_state_count:
+                self.known_states.popitem(last=False)
+        return known_state
+
     def try_move(self, domino, dx, dy):
         try:
             new_state, remaining = self.move(domino, dx, dy)
@@ -1095,20 +1816,30 @@ class BoardGraph(object):
         solution = []
         if solution_nodes is None:
             solution_nodes = self.get_solution_nodes(return_partial)
+        encode = self.state_codec.encode
         for i in range(len(solution_nodes)-1):
             source, target = solution_nodes[i:i+2]
-            solution.append(self.graph[source][target]['move'])
+            edge_attrs = self.graph.get_edge_data(encode(source), encode(target))
+            solution.append(edge_attrs['move'])
         return solution
 
     def get_solution_nodes(self, return_partial=False):
         goal = self.closest if return_partial else self.last or ''
-        solution_nodes = shortest_path(self.graph, self.start, goal)
-        return solution_nodes
+        codec = self.state_codec
+        start_key = codec.encode(self.start)
+        goal_key = codec.encode(goal)
+        if isinstance(self.graph, AdjacencyGraph):
+            solution_keys = self.graph.shortest_path(start_key, goal_key)
+        else:
+            solution_keys = shortest_path(self.graph, start_key, goal_key)
+        return [codec.decode(key) for key in solution_keys]
 
     def get_choice_counts(self, solution_nodes=None):
         if solution_nodes is None:
             solution_nodes = self.get_solution_nodes()
-        return [len(self.graph[node]) for node in solution_nodes[:-1]]
+        encode = self.state_codec.encode
+        return [self.graph.out_degree(encode(node))
+                for node in solution_nodes[:-1]]
 
     def get_average_choices(self, solution_nodes=None):
         choices = self.get_choice_counts(solution_nodes)
@@ -1289,7 +2020,7 @@ class SearchManager(object):
             board = Board.create(start, max_pips=6)
             try:
                 analysis = BoardAnalysis(board,
-                                         self.graph_class,
+                                         self.graph_class(),
                                          size_limit=MAX_BOARD_SIZE)
                 results_queue.put((start, analysis.get_values()))
             except GraphLimitExceeded:
@@ -1348,7 +2079,8 @@ OPTIMUM_SOLUTION_LENGTH = WIDTH*HEIGHT
 
 
 def find_boards_with_deap(graph_class=CaptureBoardGraph,
-                          board_class=Board):
+                          board_class=Board,
+                          event_log: EventLog = None):
     print('Starting.')
     random = Random()
     manager = Manager()
@@ -1363,7 +2095,9 @@ def find_boards_with_deap(graph_class=CaptureBoardGraph,
 
     toolbox = base.Toolbox()
     pool = Pool()
-    halloffame = hall_of_fame.MappedHallOfFame(10, solution_length_index=2)
+    halloffame = hall_of_fame.MappedHallOfFame(10,
+                                               solution_length_index=2,
+                                               event_log=event_log)
     pool.apply_async(search_manager.evaluate_slow_boards,
                      [slow_queue, results_queue])
     toolbox.register("map", search_manager.loggedMap, pool)
@@ -1419,7 +2153,7 @@ def measure_performance():
 0 3 4|6 2|5
 """
     board = Board.create(state, max_pips=6)
-    analysis = BoardAnalysis(board)
+    analysis = BoardAnalysis(board, CaptureBoardGraph())
     print(analysis.display())
 
 
@@ -1427,7 +2161,7 @@ def analyseRandomBoard(random):
     # start_time = datetime.now()
     board = Board(6, 5, max_pips=6)
     board.fill(random)
-    analysis = BoardAnalysis(board)
+    analysis = BoardAnalysis(board, CaptureBoardGraph())
     # duration = (datetime.now() - start_time).total_seconds()
     return analysis.graph_size, analysis.score
 
@@ -1,7 +1,10 @@
 import random
 import typing
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
 from collections import defaultdict
+from datetime import datetime
 from enum import Enum, IntEnum
+from functools import lru_cache
 from itertools import chain
 from sys import maxsize
 
@@ -9,7 +12,9 @@ from networkx import shortest_path, DiGraph, edges, NetworkXNoPath, NodeNotFound
 
 from domino_puzzle import (Board, Cell, BoardGraph, GraphLimitExceeded, DiceSet,
                            ArrowSet, MoveDescription)
+from event_log import EventLog
 from evo import Individual, Evolution
+from fitness_cache import FitnessCache, cached_fitness
 
 MoveType = IntEnum('MoveType', ('SINGLE_NEIGHBOUR',
                                 'NEWLY_JOINED',
@@ -72,15 +77,27 @@ class DominosaProblem(Individual):
         #         self_head[i] = mapping[self_head[i]]
 
         # return DominosaProblem(np.hstack([self_head, other_tail]))
-        return DominosaProblem(self.value)
+        child = DominosaProblem(self.value)
+        # Mutate keeps these along with the fitness, if the pips don't change.
+        child.results = dict(self.results)
+        child.results.pop('is_cached', None)
+        return child
 
     def mutate(self, mutate_params):
         max_pips = self.value['max_pips']
         board = DominosaBoard.create(self.value['solution'],
                                      max_pips=max_pips)
         new_board = board.mutate(random, DominosaBoard)
-        self.value = dict(solution=new_board.display(),
-                          max_pips=max_pips)
+        new_value = dict(solution=new_board.display(), max_pips=max_pips)
+        fitness = self.value.get('fitness')
+        if fitness is not None and board.has_same_pips(
+                new_board,
+                new_board.mutated_cells):
+            # The puzzle only shows the pips, so it solves the same way.
+            new_value['fitness'] = fitness
+        else:
+            self.results.clear()
+        self.value = new_value
 
     def _random_init(self, init_params):
         max_pips = init_params['max_pips']
@@ -94,8 +111,9 @@ class DominosaProblem(Individual):
 
 
 class FitnessCalculator:
-    def __init__(self, move_weights=None):
+    def __init__(self, move_weights=None, cache: FitnessCache = None):
         self.move_weights = move_weights or LEVEL_WEIGHTS['easy']
+        self.cache = cache
         self.details = []
         self.summaries = []
 
@@ -109,6 +127,14 @@ class FitnessCalculator:
         self.details.clear()
         return display
 
+    def get_cache_key(self, value):
+        # JSON object keys must be strings, so list the weights as pairs.
+        return FitnessCache.make_key('dominosa',
+                                     value['solution'],
+                                     value['max_pips'],
+                                     sorted(self.move_weights.items()))
+
+    @cached_fitness
     def calculate(self, problem):
         """ Calculate fitness score based on the solution.
 
@@ -166,6 +192,7 @@ class FitnessCalculator:
         self.summaries.append(f'{board.width}x{board.height} {fitness} '
                               f'({len(graph.graph)} nodes)')
 
+        problem.results['graph_size'] = len(graph.graph)
         value['fitness'] = fitness
         return fitness
 
@@ -188,7 +215,7 @@ def find_unique_pairs(board: Board) -> typing.List[typing.Tuple[int]]:
     return all_locations
 
 
-def find_pair_locations(board: Board) -> dict:
+def find_pair_locations(board: 'DominosaBoard') -> dict:
     """ Find how many times each pair of numbers appears in the unjoined cells.
 
     :param board: board to search
@@ -196,13 +223,9 @@ def find_pair_locations(board: Board) -> dict:
         None if a matching domino has already been placed.
     """
     pair_locations = defaultdict(list)
-    for x in range(board.width):
-        for y in range(board.height):
-            cell = board[x][y]
-            if 0 < x:
-                record_pair(board[x - 1][y], cell, pair_locations)
-            if 0 < y:
-                record_pair(board[x][y - 1], cell, pair_locations)
+    all_pairs, _ = board.get_pair_index()
+    for x1, y1, x2, y2 in all_pairs:
+        record_pair(board[x1][y1], board[x2][y2], pair_locations)
     return pair_locations
 
 
@@ -219,19 +242,9 @@ def find_pairs_by_pips(board, head_pips, tail_pips):
 
     :return: generator of (x1, y1, x2, y2) pairs with the same pips
     """
-    target_pips = {head_pips, tail_pips}
-    for x in range(board.width):
-        for y in range(board.height):
-            head_pips = board[x][y].pips
-            pairs = []
-            if 0 < x:
-                pairs.append((x-1, y, x, y))
-            if 0 < y:
-                pairs.append((x, y-1, x, y))
-            for x1dup, y1dup, x2dup, y2dup in pairs:
-                dup_pips = {head_pips, board[x1dup][y1dup].pips}
-                if target_pips == dup_pips:
-                    yield x1dup, y1dup, x2dup, y2dup
+    _, pairs_by_pips = board.get_pair_index()
+    key = (min(head_pips, tail_pips), max(head_pips, tail_pips))
+    yield from pairs_by_pips.get(key, ())
 
 
 def record_pair(cell1: Cell, cell2: Cell, pair_locations: dict):
@@ -265,6 +278,35 @@ def get_pair_key(cell1, cell2):
     return key
 
 
+@lru_cache(maxsize=1000)
+def index_pairs(column_pips: tuple) -> typing.Tuple[list, dict]:
+    """ List all the neighbouring pairs of cells, and group them by pips.
+
+    The pips never change while a puzzle is solved, so all the boards from
+    one search share an index.
+    :param column_pips: a tuple of pips for each column of the board
+    :return: (all_pairs, pairs_by_pips) where all_pairs is
+        [(x1, y1, x2, y2)], and pairs_by_pips is
+        {(small_pips, large_pips): [(x1, y1, x2, y2)]}. Both list the
+        pairs column by column, in the order of their second cells.
+    """
+    all_pairs = []
+    pairs_by_pips = defaultdict(list)
+    for x, pips_column in enumerate(column_pips):
+        for y, pips in enumerate(pips_column):
+            pairs = []
+            if 0 < x:
+                pairs.append((x-1, y, x, y))
+            if 0 < y:
+                pairs.append((x, y-1, x, y))
+            for x1, y1, x2, y2 in pairs:
+                other_pips = column_pips[x1][y1]
+                key = (min(pips, other_pips), max(pips, other_pips))
+                all_pairs.append((x1, y1, x2, y2))
+                pairs_by_pips[key].append((x1, y1, x2, y2))
+    return all_pairs, dict(pairs_by_pips)
+
+
 class DominosaBoard(Board):
     @classmethod
     def create(cls, state, border=0, max_pips=None):
@@ -279,6 +321,37 @@ class DominosaBoard(Board):
                  arrows: ArrowSet = None):
         super().__init__(width, height, max_pips, dice_set, arrows)
         self.pair_states = {}
+        self.pair_index = None  # See get_pair_index().
+
+    def get_pair_index(self) -> typing.Tuple[list, dict]:
+        """ Index the neighbouring pairs of cells, see index_pairs().
+
+        The index is built the first time, so call it after all the cells
+        are filled.
+        """
+        if self.pair_index is None:
+            column_pips = tuple(tuple(cell.pips for cell in column)
+                                for column in self.cells)
+            self.pair_index = index_pairs(column_pips)
+        return self.pair_index
+
+    def count_unplaced(self) -> int:
+        """ Count dominoes that aren't joined yet, from the pair states.
+
+        Equivalent to len(extra_dominoes) after parsing display(), but
+        without rendering and parsing the board. A domino joined twice only
+        counts once, so a board with duplicates never reaches zero.
+        """
+        if self.max_pips is None:
+            raise ValueError('Board does not have max_pips set.')
+        cells = self.cells
+        joined_keys = {get_pair_key(cells[x1][y1], cells[x2][y2])
+                       for (x1, y1, x2, y2), pair_state
+                       in self.pair_states.items()
+                       if pair_state in (PairState.JOINED,
+                                         PairState.NEWLY_JOINED)}
+        domino_count = (self.max_pips + 1) * (self.max_pips + 2) // 2
+        return domino_count - len(joined_keys)
 
     def get_pair_state(self, x1: int, y1: int, x2: int, y2: int):
         if x2 < x1 or y2 < y1:
@@ -350,24 +423,15 @@ class DominosaBoard(Board):
     def adjust_display(self, display: typing.List[typing.List[str]]):
         if not self.pair_states:
             return
-        for x1 in range(self.width):
-            for y1 in range(self.height):
-                for x2 in (x1, x1+1):
-                    for y2 in (y1, y1+1):
-                        if x2 >= self.width or y2 >= self.height:
-                            # Off the board.
-                            continue
-                        if (x1 == x2) == (y1 == y2):
-                            # Not a neighbour.
-                            continue
-                        pair_state = self.pair_states[(x1, y1, x2, y2)]
-                        if x1 == x2:
-                            pair_display = PairState.vertical_displays[pair_state]
-                        else:
-                            pair_display = PairState.horizontal_displays[pair_state]
-                        i = self.height*2 - y1 - y2 - 2
-                        j = x1 + x2
-                        display[i][j] = pair_display
+        vertical_displays = PairState.vertical_displays
+        horizontal_displays = PairState.horizontal_displays
+        row_count = self.height*2 - 2
+        for (x1, y1, x2, y2), pair_state in self.pair_states.items():
+            if x1 == x2:
+                pair_display = vertical_displays[pair_state]
+            else:
+                pair_display = horizontal_displays[pair_state]
+            display[row_count - y1 - y2][x1 + x2] = pair_display
 
     def find_neighbours(self, x1, y1, x2, y2):
         """ Yield all neighbouring pairs of this pair, regardless of state. """
@@ -617,11 +681,9 @@ class DominosaGraph(BoardGraph):
                     print()
                     print(move)
                     print(state)
-                new_board: DominosaBoard = self.board_class.create(
-                    state,
-                    max_pips=board.max_pips)
-                remaining = self.check_progress(new_board)
-                if not new_board.extra_dominoes:
+                # The generators yield with the move still applied to board.
+                remaining = self.check_progress(board)
+                if not remaining:
                     state = clean_solution(board)
                     self.solution_states.add(state)
                     if self.last is None:
@@ -642,10 +704,7 @@ class DominosaGraph(BoardGraph):
 
     def check_progress(self, board: DominosaBoard) -> int:
         """ Check how close a board is to a solution. """
-        if board.max_pips is None:
-            raise ValueError('Board does not have max_pips set.')
-        domino_count = len(board.extra_dominoes)
-        return domino_count
+        return board.count_unplaced()
 
 
 def clean_solution(board: DominosaBoard) -> str:
@@ -665,16 +724,35 @@ def clean_solution(board: DominosaBoard) -> str:
     return clean_state
 
 
+def parse_args():
+    parser = ArgumentParser(description='Search for Dominosa problems.',
+                            formatter_class=ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--cache',
+                        help='SQLite file to store fitness results in, so a '
+                             'restarted search skips problems it has scored.')
+    parser.add_argument('--events',
+                        help='JSON Lines file to append progress events to. '
+                             'Watch it with event_log.py.')
+    parser.add_argument('--resume',
+                        help='Checkpoint file to save progress in. If it '
+                             'exists, the search continues from it.')
+    return parser.parse_args()
+
+
 def main():
     # Suggested sizes:
     # easy (1-3) 2, 3, 4
     # medium (4-8) 3, 4, 4, 5, 5
     # hard (9-14) 4, 4, 5, 5, 6, 6
     # tricky (15-20) 4, 4, 5, 5, 6, 6
+    start_time = datetime.now()
+    args = parse_args()
+    event_log = None if args.events is None else EventLog(args.events)
     move_weights = LEVEL_WEIGHTS['tricky']
 
     max_pips = 5
-    fitness_calculator = FitnessCalculator(move_weights)
+    cache = None if args.cache is None else FitnessCache(args.cache)
+    fitness_calculator = FitnessCalculator(move_weights, cache=cache)
     init_params = dict(max_pips=max_pips, width=max_pips+2, height=max_pips+1)
     evo = Evolution(
         pool_size=100,
@@ -683,17 +761,23 @@ def main():
         n_offsprings=30,
         pair_params=None,
         mutate_params=None,
-        init_params=init_params)
+        init_params=init_params,
+        event_log=event_log,
+        checkpoint_path=args.resume,
+        resume_path=args.resume)
     n_epochs = 1000
 
     hist = []
-    for i in range(n_epochs):
+    for i in range(evo.start_epoch, n_epochs):
         top_individual = evo.pool.individuals[-1]
         top_fitness = evo.pool.fitness(top_individual)
         mid_fitness = evo.pool.fitness(evo.pool.individuals[-len(evo.pool.individuals)//5])
         print(i, top_fitness, mid_fitness, repr(strip_solution(top_individual.value['solution'])))
         hist.append(top_fitness)
         evo.step()
+        evo.log_epoch(i)
+        evo.check_checkpoint(i + 1)
+    evo.save_checkpoint(n_epochs)
 
     best = evo.pool.individuals[-1]
     for problem in evo.pool.individuals:
@@ -702,6 +786,9 @@ def main():
     # plt.show()
     solution = best.value['solution']
     print(strip_solution(solution))
+    evo.log_finish(n_epochs, datetime.now() - start_time)
+    if event_log is not None:
+        event_log.close()
 
 
 def strip_solution(solution):
@@ -1,15 +1,20 @@
 import operator
+import os
 import random
 import sys
 import typing
 from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
 from datetime import datetime
-from functools import reduce
+from functools import partial, reduce
 
+from adjacency_graph import AdjacencyGraph
 from bees import count_gaps
 from domino_puzzle import (Board, BoardGraph, GraphLimitExceeded, DiceSet,
-                           ArrowSet, MoveDescription, Domino, BoardError)
+                           ArrowSet, MoveDescription, Domino, BoardError,
+                           PackedStateCodec)
+from event_log import EventLog
 from evo import Individual, Evolution
+from fitness_cache import FitnessCache, cached_fitness
 
 
 class DriversProblem(Individual):
@@ -50,9 +55,15 @@ class DriversProblem(Individual):
 
 
 class DriversFitnessCalculator:
-    def __init__(self, target_length=100, size_limit=11_200):
+    def __init__(self,
+                 target_length=100,
+                 size_limit=11_200,
+                 cache: FitnessCache = None,
+                 process_count: int = 2):
         self.target_length = target_length
         self.size_limit = size_limit
+        self.cache = cache
+        self.process_count = process_count  # for each graph walk
         self.details = []
         self.summaries = []
 
@@ -66,6 +77,13 @@ class DriversFitnessCalculator:
         self.details.clear()
         return display
 
+    def get_cache_key(self, value):
+        return FitnessCache.make_key('drivers',
+                                     value['start'],
+                                     self.target_length,
+                                     self.size_limit)
+
+    @cached_fitness
     def calculate(self, problem):
         """ Calculate fitness score based on the solution.
 
@@ -83,7 +101,7 @@ class DriversFitnessCalculator:
             return fitness
         board = DriversBoard.create(value['start'])
         fitness = 0
-        graph = DriversGraph(process_count=2)
+        graph = DriversGraph(process_count=self.process_count)
         try:
             graph.walk(board, size_limit=self.size_limit)
         except GraphLimitExceeded:
@@ -129,6 +147,7 @@ class DriversFitnessCalculator:
                 f'variety {variety_score}, '
                 f'{len(graph.graph)} states')
 
+        problem.results['graph_size'] = len(graph.graph)
         value['fitness'] = fitness
         return fitness
 
@@ -176,6 +195,11 @@ class DriversBoard(Board):
 # Another option: nonlinear planning using constraint posting.
 
 class DriversGraph(BoardGraph):
+    state_codec = PackedStateCodec()
+    board_cache_size = 5000
+    graph_class = AdjacencyGraph
+    expansion_batch_size = 32
+
     def __init__(self,
                  board_class=DriversBoard,
                  process_count: int = 0):
@@ -189,6 +213,9 @@ class DriversGraph(BoardGraph):
         """
         generated_moves = set()
         dice_set = board.dice_set
+        # The gap count depends on where the board is, so states are hashed
+        # uncropped, even though they're displayed cropped.
+        show_cropped = partial(board.display, cropped=True)
         forced_pips = None
         for (x, y), pips in dice_set.items():
             cell = board[x][y]
@@ -213,12 +240,15 @@ class DriversGraph(BoardGraph):
                     continue
                 positions = [(x, y), (x2, y2)]
                 move = dice_set.move(*positions, show_length=False)
-                combined_display = board.display(cropped=True)
-                total_gaps = self.check_progress(board)
+                combined_display, total_gaps = self.describe_state(
+                    board,
+                    cropped=False,
+                    display=show_cropped)
                 yield MoveDescription(move,
                                       combined_display,
                                       heuristic=total_gaps,
-                                      remaining=total_gaps)
+                                      remaining=total_gaps,
+                                      delta=(('die', x, y, dx, dy),))
                 positions.reverse()
                 dice_set.move(*positions)
             # Try to drive domino
@@ -242,6 +272,13 @@ class DriversGraph(BoardGraph):
                 except BoardError:
                     continue
                 if board.is_connected():
+                    delta = (('domino',
+                              domino.head.x-dx,
+                              domino.head.y-dy,
+                              dx,
+                              dy),)
+                    delta += tuple(('die', x2, y2, dx, dy)
+                                   for x2, y2 in dice_start_positions)
                     x, y = dice_start_positions[0]
                     positions = [(x, y), (x+dx, y+dy)]
                     move = dice_set.move(*positions, show_length=False)
@@ -252,14 +289,17 @@ class DriversGraph(BoardGraph):
                         dice_set.move(*positions2)
                     else:
                         positions2 = None
-                    combined_display = board.display(cropped=True)
-                    total_gaps = self.check_progress(board)
+                    combined_display, total_gaps = self.describe_state(
+                        board,
+                        cropped=False,
+                        display=show_cropped)
                     if move not in generated_moves:
                         generated_moves.add(move)
                         yield MoveDescription(move,
                                               combined_display,
                                               remaining=total_gaps,
-                                              heuristic=total_gaps)
+                                              heuristic=total_gaps,
+                                              delta=delta)
                     if len(dice_start_positions) == 2:
                         positions2.reverse()
                         dice_set.move(*positions2)
@@ -270,9 +310,9 @@ class DriversGraph(BoardGraph):
     def check_progress(self, board: DriversBoard) -> int:
         """ See how close a board is to a solution. """
         positions = {(x, y)
-                     for x in range(board.width)
-                     for y in range(board.height)
-                     if (cell := board[x][y]) is not None and cell.pips == 0}
+                     for x, column in enumerate(board.cells)
+                     for y, cell in enumerate(column)
+                     if cell is not None and cell.pips == 0}
         return count_gaps(positions, board.width, board.height)
 
 
@@ -304,11 +344,34 @@ def parse_args():
                         type=int,
                         default=2,
                         help='Number of evolutionary pools.')
+    parser.add_argument('--island_epochs',
+                        type=int,
+                        default=0,
+                        help='Number of epochs that each pool evolves in its '
+                             'own worker process before the best problems '
+                             'migrate to the next pool. 0 steps all pools '
+                             'together, and scores problems in the workers.')
     parser.add_argument('--epochs',
                         '-e',
                         type=int,
                         default=1000,
                         help='Number of evolutionary epochs.')
+    parser.add_argument('--cache',
+                        help='SQLite file to store fitness results in, so a '
+                             'restarted search skips problems it has scored.')
+    parser.add_argument('--processes',
+                        type=int,
+                        default=os.cpu_count(),
+                        help='Number of worker processes that score new '
+                             'problems, each searching serially. 0 scores '
+                             'them one at a time, with a few processes for '
+                             'each search.')
+    parser.add_argument('--events',
+                        help='JSON Lines file to append progress events to. '
+                             'Watch it with event_log.py.')
+    parser.add_argument('--resume',
+                        help='Checkpoint file to save progress in. If it '
+                             'exists, the search continues from it.')
     return parser.parse_args()
 
 
@@ -319,8 +382,15 @@ def main():
     print(f'Searching for solutions of length {args.target_length} '
           f'with up to {max_pips} pips.')
     target_total = args.target_length
+    cache = None if args.cache is None else FitnessCache(args.cache)
     fitness_calculator = DriversFitnessCalculator(target_length=args.target_length,
-                                                  size_limit=100_000)
+                                                  size_limit=100_000,
+                                                  cache=cache)
+    if args.processes:
+        # Each evolution worker searches serially, instead of starting its
+        # own pool of search workers.
+        fitness_calculator.process_count = 0
+    event_log = None if args.events is None else EventLog(args.events)
     init_params = dict(max_pips=max_pips,
                        width=max_pips+2,
                        height=max_pips+1)
@@ -332,26 +402,40 @@ def main():
         pair_params=None,
         mutate_params=None,
         init_params=init_params,
-        pool_count=args.num_pools)
+        pool_count=args.num_pools,
+        process_count=args.processes,
+        event_log=event_log,
+        checkpoint_path=args.resume,
+        resume_path=args.resume,
+        island_epochs=args.island_epochs)
     n_epochs = args.epochs
 
     hist = []
-    for i in range(n_epochs):
-        top_individual = evo.pool.individuals[-1]
-        top_fitness = evo.pool.fitness(top_individual)
-        mid_fitness = evo.pool.fitness(evo.pool.individuals[-len(evo.pool.individuals)//5])
-        summaries = []
-        for pool in evo.pools:
-            pool_fitness = pool.fitness(pool.individuals[-1])
-            total = pool_fitness % 1000
-            summaries.append(f'{total}/{target_total}')
-        print(i,
-              top_fitness,
-              mid_fitness,
-              repr(top_individual.value['start']),
-              ', '.join(summaries))
-        hist.append(top_fitness)
-        evo.step()
+    try:
+        for i in range(evo.start_epoch, n_epochs, evo.epochs_per_step):
+            # The last step stops at n_epochs.
+            step_epochs = min(evo.epochs_per_step, n_epochs - i)
+            top_individual = evo.pool.individuals[-1]
+            top_fitness = evo.pool.fitness(top_individual)
+            mid_fitness = evo.pool.fitness(
+                evo.pool.individuals[-len(evo.pool.individuals)//5])
+            summaries = []
+            for pool in evo.pools:
+                pool_fitness = pool.fitness(pool.individuals[-1])
+                total = pool_fitness % 1000
+                summaries.append(f'{total}/{target_total}')
+            print(i,
+                  top_fitness,
+                  mid_fitness,
+                  repr(top_individual.value['start']),
+                  ', '.join(summaries))
+            hist.extend([top_fitness] * step_epochs)
+            evo.step(step_epochs)
+            evo.log_epoch(i)
+            evo.check_checkpoint(i + step_epochs)
+        evo.save_checkpoint(n_epochs)
+    finally:
+        evo.close()
 
     best = evo.pool.individuals[-1]
     for problem in evo.pool.individuals:
@@ -362,6 +446,9 @@ def main():
     print(solution)
     duration = datetime.now() - start_time
     print(f'Finished {n_epochs} epochs in {duration}.')
+    evo.log_finish(n_epochs, duration)
+    if event_log is not None:
+        event_log.close()
 
 
 if __name__ == '__main__':
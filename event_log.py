@@ -0,0 +1,112 @@
+""" Record progress of long searches as a stream of JSON Lines events.
+
+Each line is a JSON object with an event name, a timestamp, and whatever
+fields the event needs. The file is only appended to, so a run can be
+watched while it's still going:
+
+    python event_log.py bees_events.jsonl --follow
+"""
+import json
+import typing
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from time import sleep, time
+
+
+class EventLog:
+    """ Append events to a JSON Lines file.
+
+    Events are buffered, so call flush() when a batch of events is complete,
+    like at the end of each epoch.
+    """
+    def __init__(self, path: str, buffer_size: int = 64 * 1024):
+        self.path = path
+        self.file = open(path, 'a', buffering=buffer_size)
+
+    def __repr__(self):
+        return f'EventLog({self.path!r})'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write(self, event: str, **fields):
+        record = dict(event=event, time=round(time(), 3), **fields)
+        self.file.write(json.dumps(record) + '\n')
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def read_events(path: str,
+                follow: bool = False,
+                poll_seconds: float = 1.0) -> typing.Iterator[dict]:
+    """ Read events from a JSON Lines file.
+
+    :param path: the file to read
+    :param follow: True if it should wait for more events at the end of the
+        file, like tail -f.
+    :param poll_seconds: how long to wait before checking for more events
+    """
+    with open(path) as events_file:
+        partial_line = ''
+        while True:
+            line = events_file.readline()
+            if not line.endswith('\n'):
+                # End of file, possibly part way through writing a line.
+                partial_line += line
+                if not follow:
+                    break
+                sleep(poll_seconds)
+                continue
+            line = partial_line + line
+            partial_line = ''
+            if line.strip():
+                yield json.loads(line)
+
+
+def format_event(event: dict, show_states: bool = False) -> str:
+    fields = ', '.join(f'{name} {value}'
+                       for name, value in event.items()
+                       if name not in ('event', 'time', 'state'))
+    display = f'{event["event"]}: {fields}'
+    state = event.get('state')
+    if show_states and state is not None:
+        display += '\n' + state.rstrip()
+    return display
+
+
+def parse_args():
+    parser = ArgumentParser(description='Show events from a search.',
+                            formatter_class=ArgumentDefaultsHelpFormatter)
+    parser.add_argument('path', help='JSON Lines file to read events from.')
+    parser.add_argument('--follow',
+                        '-f',
+                        action='store_true',
+                        help='Wait for more events at the end of the file.')
+    parser.add_argument('--event',
+                        '-e',
+                        help='Only show events with this name.')
+    parser.add_argument('--states',
+                        '-s',
+                        action='store_true',
+                        help='Show board states, as well as the other fields.')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    try:
+        for event in read_events(args.path, follow=args.follow):
+            if args.event is None or event['event'] == args.event:
+                print(format_event(event, args.states), flush=True)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
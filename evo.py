@@ -1,6 +1,15 @@
 # Based on https://github.com/Garve/Evolutionary-Algorithm
+import gzip
+import json
+import os
+import random
+import typing
 from abc import ABC, abstractmethod
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from time import perf_counter
+
+from event_log import EventLog
 
 
 class Individual(ABC):
@@ -9,6 +18,9 @@ class Individual(ABC):
             self.value = value
         else:
             self.value = self._random_init(init_params)
+        # Reported by the fitness calculator, like graph_size. Kept out of
+        # value, so it doesn't change which problem this is.
+        self.results = {}
 
     @abstractmethod
     def pair(self, other, pair_params):
@@ -24,9 +36,25 @@ class Individual(ABC):
 
 
 class Population:
-    def __init__(self, size, fitness, individual_class, init_params):
+    def __init__(self,
+                 size,
+                 fitness,
+                 individual_class,
+                 init_params,
+                 evaluate: typing.Callable[[list], None] = None,
+                 values: typing.List[dict] = None):
+        """ Initialize.
+
+        :param values: values for the individuals, like from a checkpoint,
+            or None to create size random individuals.
+        """
         self.fitness = fitness
-        self.individuals = [individual_class(init_params=init_params) for _ in range(size)]
+        if values is None:
+            self.individuals = [individual_class(init_params=init_params) for _ in range(size)]
+        else:
+            self.individuals = [individual_class(value) for value in values]
+        if evaluate is not None:
+            evaluate(self.individuals)
         self.sort()
         self.replace_count = 0
         self.unimproved_count = 0  # Number of times replace() didn't improve.
@@ -56,12 +84,86 @@ class Population:
         else:
             self.unimproved_count += 1
 
+    def immigrate(self, individuals):
+        """ Add individuals from another pool, without counting a replace.
+
+        Individuals that are already in this pool get ignored.
+        """
+        values = [individual.value for individual in self.individuals]
+        size = len(self.individuals)
+        self.individuals.extend(individual
+                                for individual in individuals
+                                if individual.value not in values)
+        self.sort()
+        self.individuals = self.individuals[-size:]
+
     def get_parents(self, n_offsprings):
         mothers = self.individuals[-2 * n_offsprings::2]
         fathers = self.individuals[-2 * n_offsprings + 1::2]
 
         return mothers, fathers
 
+    def breed(self, n_offsprings, pair_params, mutate_params) -> list:
+        mothers, fathers = self.get_parents(n_offsprings)
+        offsprings = []
+
+        for mother, father in zip(mothers, fathers):
+            offspring = mother.pair(father, pair_params)
+            offspring.mutate(mutate_params)
+            offsprings.append(offspring)
+        return offsprings
+
+
+def count_cache_hits(individuals) -> int:
+    return sum(bool(individual.results.get('is_cached'))
+               for individual in individuals)
+
+
+def run_island(pool: Population,
+               epoch_count: int,
+               n_offsprings: int,
+               pair_params,
+               mutate_params,
+               seed: int) -> typing.Tuple[Population, int, int]:
+    """ Evolve one pool for several epochs, usually in a worker process.
+
+    :param seed: for the random module, so the islands don't all repeat the
+        same mutations.
+    :return: (pool, evaluation_count, cache_hits)
+    """
+    random.seed(seed)
+    evaluation_count = cache_hits = 0
+    for _ in range(epoch_count):
+        offsprings = pool.breed(n_offsprings, pair_params, mutate_params)
+        pool.replace(offsprings)
+        evaluation_count += len(offsprings)
+        cache_hits += count_cache_hits(offsprings)
+    return pool, evaluation_count, cache_hits
+
+
+# Set in each worker process by init_worker().
+worker_fitness: typing.Optional[typing.Callable[[Individual], float]] = None
+
+
+def init_worker(fitness: typing.Callable[[Individual], float]):
+    global worker_fitness
+    worker_fitness = fitness
+
+
+def calculate_in_worker(individual) -> typing.Tuple[float, dict]:
+    """ Calculate fitness in a worker process, see init_worker().
+
+    :return: (fitness, results), so they can be copied back to the parent
+        process.
+    """
+    return worker_fitness(individual), individual.results
+
+
+def read_checkpoint(path: str) -> dict:
+    """ Read a checkpoint file written by Evolution.save_checkpoint(). """
+    with gzip.open(path, 'rt') as checkpoint_file:
+        return json.load(checkpoint_file)
+
 
 class Evolution:
     def __init__(self,
@@ -72,7 +174,29 @@ class Evolution:
                  pair_params,
                  mutate_params,
                  init_params,
-                 pool_count: int = 1):
+                 pool_count: int = 1,
+                 process_count: int = 0,
+                 event_log: EventLog = None,
+                 checkpoint_path: str = None,
+                 checkpoint_seconds: float = 300,
+                 resume_path: str = None,
+                 island_epochs: int = 0,
+                 migration_count: int = 2):
+        """ Initialize.
+
+        :param process_count: number of worker processes that calculate
+            fitness for new individuals, or 0 to calculate it as needed.
+            In island mode, they evolve the pools instead.
+        :param event_log: where to record progress after each epoch, or None
+        :param checkpoint_path: file to save checkpoints in, or None
+        :param checkpoint_seconds: minimum time between checkpoints
+        :param resume_path: checkpoint file to load the pools from, instead
+            of creating random ones. Ignored if the file doesn't exist.
+        :param island_epochs: number of epochs that each pool evolves on its
+            own in step(), or 0 to step all pools together for one epoch.
+        :param migration_count: number of top individuals that get copied
+            to the next pool after each island step.
+        """
         self.pair_params = pair_params
         self.mutate_params = mutate_params
         self.pool_size = pool_size
@@ -80,10 +204,48 @@ class Evolution:
         self.individual_class = individual_class
         self.init_params = init_params
         self.pool_count = pool_count
+        self.island_epochs = island_epochs
+        self.migration_count = migration_count
+        if process_count > 0:
+            # The fitness calculator is sent once to each worker, instead of
+            # with every individual.
+            self.executor = ProcessPoolExecutor(process_count,
+                                                initializer=init_worker,
+                                                initargs=(fitness,))
+        else:
+            self.executor: typing.Optional[ProcessPoolExecutor] = None
         self.pools = []
-        self.add_pools()
-        self.n_offsprings = n_offsprings
         self.history = []
+        self.start_epoch = 0  # Number of epochs run before a checkpoint.
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_seconds = checkpoint_seconds
+        self.checkpoint_time = perf_counter()
+        # Anything else that's JSON-friendly to save with each checkpoint.
+        self.checkpoint_extras = {}
+        try:
+            if resume_path is not None and os.path.exists(resume_path):
+                self.load_checkpoint(resume_path)
+            else:
+                self.add_pools()
+        except BaseException:
+            self.close()
+            raise
+        self.n_offsprings = n_offsprings
+        self.event_log = event_log
+        self.evaluation_count = self.cache_hits = 0  # Since last log_epoch().
+        self.epoch_start = perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """ Shut down the worker processes, if there are any. """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
 
     @property
     def pool(self):
@@ -94,37 +256,115 @@ class Evolution:
             self.pools.append(Population(self.pool_size,
                                          self.fitness,
                                          self.individual_class,
-                                         self.init_params))
+                                         self.init_params,
+                                         self.evaluate))
 
-    def step(self):
-        is_stale = False
-        for pool in self.pools:
-            mothers, fathers = pool.get_parents(self.n_offsprings)
-            offsprings = []
+    def evaluate(self, individuals):
+        """ Calculate fitness for all the individuals in worker processes.
 
-            for mother, father in zip(mothers, fathers):
-                offspring = mother.pair(father, self.pair_params)
-                offspring.mutate(self.mutate_params)
-                offsprings.append(offspring)
+        The workers can't change the individuals, so each fitness gets
+        copied back to value['fitness'], where the fitness calculators look
+        before they do any work. The reported results get copied, too.
+        """
+        if self.executor is None:
+            return
+        new_individuals = [individual
+                           for individual in individuals
+                           if individual.value.get('fitness') is None]
+        results = self.executor.map(calculate_in_worker, new_individuals)
+        for individual, (fitness, results) in zip(new_individuals, results):
+            individual.value['fitness'] = fitness
+            individual.results.update(results)
 
-            pool.replace(offsprings)
-            is_stale = is_stale or pool.is_stale
+    @property
+    def epochs_per_step(self):
+        return self.island_epochs or 1
+
+    def step(self, epoch_count: int = None):
+        """ Run epochs_per_step epochs of evolution.
+
+        :param epoch_count: number of epochs to run instead, when fewer than
+            epochs_per_step are left.
+        """
+        if self.island_epochs:
+            self.step_islands(epoch_count or self.island_epochs)
+        else:
+            all_offsprings = [pool.breed(self.n_offsprings,
+                                         self.pair_params,
+                                         self.mutate_params)
+                              for pool in self.pools]
 
+            self.evaluate([offspring
+                           for offsprings in all_offsprings
+                           for offspring in offsprings])
+            for pool, offsprings in zip(self.pools, all_offsprings):
+                pool.replace(offsprings)
+                # Fitness is known for all the offspring now, even when it
+                # gets calculated as needed.
+                self.evaluation_count += len(offsprings)
+                self.cache_hits += count_cache_hits(offsprings)
+
+        is_stale = any(pool.is_stale for pool in self.pools)
         if 1 < self.pool_count and is_stale:
             self.pools.sort(key=lambda p: (-p.best_fitness, p.unimproved_count))
             while 1 < len(self.pools) and self.pools[-1].is_stale:
                 self.pools.pop()
             self.add_pools()
 
+    def step_islands(self, epoch_count: int):
+        """ Evolve each pool in its own worker process, then migrate. """
+        island_args = [(pool,
+                        epoch_count,
+                        self.n_offsprings,
+                        self.pair_params,
+                        self.mutate_params,
+                        random.getrandbits(64))
+                       for pool in self.pools]
+        if self.executor is None:
+            results = [run_island(*args) for args in island_args]
+        else:
+            futures = [self.executor.submit(run_island, *args)
+                       for args in island_args]
+            results = [future.result() for future in futures]
+        self.pools = []
+        for pool, evaluation_count, cache_hits in results:
+            self.pools.append(pool)
+            self.evaluation_count += evaluation_count
+            self.cache_hits += cache_hits
+        self.migrate()
+
+    def migrate(self):
+        """ Copy the top individuals from each pool to the next one. """
+        if len(self.pools) < 2 or self.migration_count < 1:
+            return
+        all_migrants = [[self.individual_class(dict(individual.value))
+                         for individual in
+                         pool.individuals[-self.migration_count:]]
+                        for pool in self.pools]
+        # Each pool gets migrants from the one before it, in a ring.
+        all_migrants.insert(0, all_migrants.pop())
+        for pool, migrants in zip(self.pools, all_migrants):
+            pool.immigrate(migrants)
+
     @staticmethod
     def is_finished():
         """ Called after each epoch of evolution. Return true to stop. """
         return False
 
     def run(self, max_epochs: int):
+        try:
+            self.run_epochs(max_epochs)
+        finally:
+            self.close()
+
+    def run_epochs(self, max_epochs: int):
         start_time = datetime.now()
-        self.history.clear()
-        for epoch_count in range(max_epochs):
+        start_epoch = self.start_epoch
+        self.start_epoch = 0
+        del self.history[start_epoch:]
+        for epoch_count in range(start_epoch,
+                                 max_epochs,
+                                 self.epochs_per_step):
             top_individual = self.pool.individuals[-1]
             top_fitness = self.pool.fitness(top_individual)
             mid_fitness = self.pool.fitness(
@@ -134,17 +374,127 @@ class Evolution:
                 pool_fitness = pool.fitness(pool.individuals[-1])
                 total = pool_fitness
                 summaries.append(f'{total}')
-            self.history.append(top_fitness)
+            # The last step stops at max_epochs.
+            step_epochs = min(self.epochs_per_step, max_epochs - epoch_count)
+            # Islands only report between steps, so keep one entry per epoch.
+            self.history.extend([top_fitness] * step_epochs)
             self.print_step_summaries(top_individual,
                                       top_fitness,
                                       mid_fitness,
                                       summaries)
-            self.step()
+            self.step(step_epochs)
+            self.log_epoch(epoch_count)
             if self.is_finished():
                 break
+            self.check_checkpoint(epoch_count + step_epochs)
 
         duration = datetime.now() - start_time
+        self.save_checkpoint(len(self.history))
         self.print_final_summary(duration)
+        self.log_finish(len(self.history), duration)
+
+    def check_checkpoint(self, epoch_count: int):
+        """ Save a checkpoint, if it's been long enough since the last one.
+
+        :param epoch_count: number of epochs finished so far
+        """
+        if perf_counter() - self.checkpoint_time >= self.checkpoint_seconds:
+            self.save_checkpoint(epoch_count)
+
+    def save_checkpoint(self, epoch_count: int):
+        """ Save the pools and random state, so a search can be resumed.
+
+        The file is written next to the old one, then swapped in, so an
+        interruption can't leave a broken checkpoint. Does nothing if there
+        is no checkpoint_path.
+        :param epoch_count: number of epochs finished so far
+        """
+        if self.checkpoint_path is None:
+            return
+        version, internal_state, gauss_next = random.getstate()
+        checkpoint = dict(
+            epoch_count=epoch_count,
+            history=self.history,
+            pools=[dict(values=[individual.value
+                                for individual in pool.individuals],
+                        replace_count=pool.replace_count,
+                        unimproved_count=pool.unimproved_count)
+                   for pool in self.pools],
+            random_state=[version, internal_state, gauss_next],
+            extras=self.checkpoint_extras)
+        new_path = self.checkpoint_path + '.new'
+        with gzip.open(new_path, 'wt') as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file)
+        os.replace(new_path, self.checkpoint_path)
+        self.checkpoint_time = perf_counter()
+
+    def load_checkpoint(self, path: str):
+        """ Load the pools and random state from a checkpoint file.
+
+        Sets start_epoch to the number of epochs that had finished.
+        """
+        checkpoint = read_checkpoint(path)
+        self.pools = []
+        for pool_state in checkpoint['pools']:
+            pool = Population(self.pool_size,
+                              self.fitness,
+                              self.individual_class,
+                              self.init_params,
+                              self.evaluate,
+                              values=pool_state['values'])
+            pool.replace_count = pool_state['replace_count']
+            pool.unimproved_count = pool_state['unimproved_count']
+            self.pools.append(pool)
+        version, internal_state, gauss_next = checkpoint['random_state']
+        random.setstate((version, tuple(internal_state), gauss_next))
+        self.history[:] = checkpoint['history']
+        self.start_epoch = checkpoint['epoch_count']
+        self.checkpoint_extras = checkpoint['extras']
+
+    def log_epoch(self, epoch: int):
+        """ Record the best individual in each pool, if there's an event log.
+
+        Writes a pool event for each pool, then an epoch event with the
+        counts since the last call.
+        """
+        if self.event_log is None:
+            return
+        for pool_index, pool in enumerate(self.pools):
+            individuals = pool.individuals
+            top_value = individuals[-1].value
+            top_results = individuals[-1].results
+            self.event_log.write(
+                'pool',
+                epoch=epoch,
+                pool=pool_index,
+                best_fitness=pool.fitness(individuals[-1]),
+                mid_fitness=pool.fitness(individuals[-len(individuals) // 5]),
+                graph_size=top_results.get('graph_size'),
+                solve_seconds=top_results.get('solve_seconds'),
+                state=top_value.get('start', top_value.get('solution')))
+        epoch_end = perf_counter()
+        self.event_log.write('epoch',
+                             epoch=epoch,
+                             pool_count=len(self.pools),
+                             evaluations=self.evaluation_count,
+                             cache_hits=self.cache_hits,
+                             seconds=round(epoch_end - self.epoch_start, 3))
+        self.event_log.flush()
+        self.evaluation_count = self.cache_hits = 0
+        self.epoch_start = epoch_end
+
+    def log_finish(self, epoch_count: int, duration: timedelta):
+        """ Record the best individual at the end, if there's an event log. """
+        if self.event_log is None:
+            return
+        best_value = self.pool.individuals[-1].value
+        self.event_log.write('finished',
+                             epochs=epoch_count,
+                             seconds=round(duration.total_seconds(), 3),
+                             best_fitness=self.pool.best_fitness,
+                             state=best_value.get('start',
+                                                  best_value.get('solution')))
+        self.event_log.flush()
 
     def print_final_summary(self, duration):
         best = self.pool.individuals[-1]
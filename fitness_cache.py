@@ -0,0 +1,182 @@
+import json
+import sqlite3
+import typing
+from functools import wraps
+from time import perf_counter
+
+
+class FitnessCache:
+    """ Remember fitness results in an SQLite file, across runs.
+
+    Each entry holds the fitness, plus the summaries and details that the
+    calculator reported, so a cached problem reports the same text. When
+    there are more than max_size entries, the least recently used ones are
+    dropped.
+
+    When a cache is sent to a worker process, the worker opens its own
+    connection to the same file, and counts its own hits and misses.
+    """
+    # Usage order is shared by all the processes that use the file.
+    NEXT_USE = 'SELECT coalesce(max(last_used), 0) + 1 FROM fitness'
+
+    # Seconds to wait for another process to finish writing to the file.
+    BUSY_TIMEOUT = 60
+
+    def __init__(self, path: str = ':memory:', max_size: int = 100_000):
+        self.path = path
+        self.max_size = max_size
+        self.hits = self.misses = 0
+        self.connection = sqlite3.connect(path, timeout=self.BUSY_TIMEOUT)
+        with self.connection:
+            self.connection.execute("""\
+CREATE TABLE IF NOT EXISTS fitness(
+    key TEXT PRIMARY KEY,
+    fitness REAL,
+    summaries TEXT,
+    details TEXT,
+    last_used INTEGER)""")
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS fitness_last_used '
+                'ON fitness(last_used)')
+            # Keep a running count of entries, so store() doesn't have to
+            # count the whole table. Triggers keep it right for all the
+            # processes that share the file.
+            self.connection.execute("""\
+CREATE TABLE IF NOT EXISTS fitness_size(
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    entry_count INTEGER)""")
+            self.connection.execute(
+                'INSERT OR IGNORE INTO fitness_size '
+                'VALUES (0, (SELECT count(*) FROM fitness))')
+            self.connection.execute("""\
+CREATE TRIGGER IF NOT EXISTS fitness_insert AFTER INSERT ON fitness
+BEGIN
+    UPDATE fitness_size SET entry_count = entry_count + 1;
+END""")
+            self.connection.execute("""\
+CREATE TRIGGER IF NOT EXISTS fitness_delete AFTER DELETE ON fitness
+BEGIN
+    UPDATE fitness_size SET entry_count = entry_count - 1;
+END""")
+
+    def __repr__(self):
+        return f'FitnessCache({self.hits} hits, {self.misses} misses)'
+
+    def __getstate__(self):
+        return dict(path=self.path, max_size=self.max_size)
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @property
+    def size(self) -> int:
+        size, = self.connection.execute(
+            'SELECT entry_count FROM fitness_size').fetchone()
+        return size
+
+    @staticmethod
+    def make_key(*params) -> str:
+        """ Combine a start state and calculator parameters into a key.
+
+        Trailing spaces and blank lines are stripped from text parameters.
+        """
+        normalized = ['\n'.join(line.rstrip()
+                                for line in param.rstrip().splitlines())
+                      if isinstance(param, str)
+                      else param
+                      for param in params]
+        return json.dumps(normalized)
+
+    def find(self,
+             key: str,
+             summaries: typing.List[str],
+             details: typing.List[str]) -> typing.Optional[float]:
+        """ Look up a fitness, and add its reports to the lists.
+
+        :return: the cached fitness, or None if it's not in the cache.
+        """
+        row = self.connection.execute(
+            'SELECT fitness, summaries, details FROM fitness WHERE key = ?',
+            (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        fitness, summaries_json, details_json = row
+        summaries.extend(json.loads(summaries_json))
+        details.extend(json.loads(details_json))
+        with self.connection:
+            self.connection.execute(
+                f'UPDATE fitness SET last_used = ({self.NEXT_USE}) '
+                f'WHERE key = ?',
+                (key,))
+        return fitness
+
+    def store(self,
+              key: str,
+              fitness: float,
+              summaries: typing.List[str],
+              details: typing.List[str]):
+        with self.connection:
+            # An upsert, because REPLACE wouldn't fire the delete trigger.
+            self.connection.execute(
+                f'INSERT INTO fitness '
+                f'VALUES (?, ?, ?, ?, ({self.NEXT_USE})) '
+                f'ON CONFLICT(key) DO UPDATE SET '
+                f'fitness = excluded.fitness, '
+                f'summaries = excluded.summaries, '
+                f'details = excluded.details, '
+                f'last_used = excluded.last_used',
+                (key,
+                 fitness,
+                 json.dumps(summaries),
+                 json.dumps(details)))
+            excess = self.size - self.max_size
+            if excess > 0:
+                self.connection.execute(
+                    'DELETE FROM fitness WHERE key IN '
+                    '(SELECT key FROM fitness ORDER BY last_used LIMIT ?)',
+                    (excess,))
+
+    def close(self):
+        self.connection.close()
+
+
+def cached_fitness(calculate):
+    """ Decorate a fitness calculator's calculate() method with a cache.
+
+    The calculator needs a cache attribute that is a FitnessCache or None,
+    summaries and details lists, and a get_cache_key(value) method. When the
+    fitness comes from the cache, problem.results['is_cached'] is set.
+    Otherwise, when it gets calculated, problem.results['solve_seconds'] is.
+    """
+    def timed_calculate(calculator, problem):
+        start_time = perf_counter()
+        fitness = calculate(calculator, problem)
+        solve_seconds = round(perf_counter() - start_time, 3)
+        problem.results['solve_seconds'] = solve_seconds
+        return fitness
+
+    @wraps(calculate)
+    def wrapper(calculator, problem):
+        cache: FitnessCache = calculator.cache
+        value = problem.value
+        if value.get('fitness') is not None:
+            return calculate(calculator, problem)
+        if cache is None:
+            return timed_calculate(calculator, problem)
+        key = calculator.get_cache_key(value)
+        fitness = cache.find(key, calculator.summaries, calculator.details)
+        if fitness is not None:
+            value['fitness'] = fitness
+            problem.results['is_cached'] = True
+            return fitness
+        summary_count = len(calculator.summaries)
+        detail_count = len(calculator.details)
+        fitness = timed_calculate(calculator, problem)
+        cache.store(key,
+                    fitness,
+                    calculator.summaries[summary_count:],
+                    calculator.details[detail_count:])
+        return fitness
+    return wrapper
@@ -1,6 +1,7 @@
 from deap.tools.support import HallOfFame
 from operator import eq
 import domino_puzzle
+from event_log import EventLog
 
 
 class MappedHallOfFame(HallOfFame):
@@ -8,11 +9,13 @@ class MappedHallOfFame(HallOfFame):
                  maxsize,
                  similar=eq,
                  filename="leader.log",
-                 solution_length_index=1):
+                 solution_length_index=1,
+                 event_log: EventLog = None):
         super(MappedHallOfFame, self).__init__(maxsize, similar)
         self.solution_length_index = solution_length_index
         self.filename = filename
         self.file_mode = 'w'
+        self.event_log = event_log
         self.map = {}  # {solution_length: best_item}
 
     def update(self, population):
@@ -39,6 +42,11 @@ class MappedHallOfFame(HallOfFame):
         with open(self.filename, self.file_mode) as f:
             f.write(display)
         self.file_mode = 'a'
+        if self.event_log is not None:
+            self.event_log.write('leader',
+                                 fitness=list(board.fitness.values),
+                                 state=display)
+            self.event_log.flush()
 
     def display(self, graph_class):
         for board in self:
@@ -3,9 +3,12 @@ import typing
 from itertools import groupby
 from sys import maxsize
 
+from adjacency_graph import AdjacencyGraph
 from domino_puzzle import (Board, BadPositionError, Domino, BoardGraph, Cell,
-                           GraphLimitExceeded, MoveDescription)
+                           GraphLimitExceeded, MoveDescription,
+                           PackedStateCodec)
 from evo import Individual, Evolution
+from fitness_cache import FitnessCache, cached_fitness
 from priority import PriorityQueue
 
 SOLVED = 'SOLVED'
@@ -25,6 +28,10 @@ def add_start_markers(board):
 
 
 class MirrorGraph(BoardGraph):
+    state_codec = PackedStateCodec()
+    board_cache_size = 5000
+    graph_class = AdjacencyGraph
+
     def __init__(self, board_class=Board):
         super().__init__(board_class)
         self.min_heuristic = None
@@ -86,7 +93,8 @@ class MirrorGraph(BoardGraph):
         return MoveDescription(move,
                                new_state,
                                heuristic=heuristic,
-                               remaining=heuristic)
+                               remaining=heuristic,
+                               delta=(('marker', x, y, dx, dy),))
 
     def try_move_domino(self,
                         domino: Domino,
@@ -106,6 +114,11 @@ class MirrorGraph(BoardGraph):
         board: Board = domino.head.board
         direction_name = domino.describe_direction(dx, dy).upper()
         move = f'{marker}d{direction_name}'
+        delta = (('domino', domino.head.x, domino.head.y, dx, dy),)
+        for cell, cell_marker in ((domino.head, head_marker),
+                                  (domino.tail, tail_marker)):
+            if cell_marker:
+                delta += (('marker', cell.x, cell.y, dx, dy),)
         original_markers = board.markers.copy()
         try:
             if head_marker:
@@ -128,7 +141,8 @@ class MirrorGraph(BoardGraph):
             return MoveDescription(move,
                                    board.display(cropped=True),
                                    heuristic=heuristic,
-                                   remaining=heuristic)
+                                   remaining=heuristic,
+                                   delta=delta)
         finally:
             domino.move(-dx, -dy)
             board.markers = original_markers
@@ -168,13 +182,13 @@ class MirrorGraph(BoardGraph):
         except GraphLimitExceeded as ex:
             if size_limit is not None and ex.limit >= size_limit:
                 raise
-            return set(self.graph.nodes())
+            return self.get_states()
 
     def add_moves(self,
-                  start_state: str,
+                  start_state: typing.Hashable,
                   moves: typing.Iterable[MoveDescription],
                   pending_nodes: PriorityQueue,
-                  g_score: typing.Dict[str, float]):
+                  g_score: typing.Dict[typing.Hashable, float]):
         super().add_moves(start_state, moves, pending_nodes, g_score)
         for description in moves:
             if description.move == SOLVED:
@@ -216,9 +230,15 @@ def group_moves(solution_moves):
 
 
 class MirrorFitnessCalculator:
-    def __init__(self, target_length=None, size_limit=10_000):
+    def __init__(self,
+                 target_length=None,
+                 size_limit=10_000,
+                 beam_width=None,
+                 cache: FitnessCache = None):
         self.target_length = target_length
         self.size_limit = size_limit
+        self.beam_width = beam_width
+        self.cache = cache
         self.details = []
         self.summaries = []
         self.is_debugging = False
@@ -233,6 +253,15 @@ class MirrorFitnessCalculator:
         self.details.clear()
         return display
 
+    def get_cache_key(self, value):
+        return FitnessCache.make_key('mirror',
+                                     value['start'],
+                                     value['max_pips'],
+                                     self.target_length,
+                                     self.size_limit,
+                                     self.beam_width)
+
+    @cached_fitness
     def calculate(self, problem):
         """ Calculate fitness score based on the solution length.
 
@@ -248,6 +277,8 @@ class MirrorFitnessCalculator:
         board = Board.create(value['start'], max_pips=value['max_pips'])
         graph = MirrorGraph()
         graph.is_debugging = self.is_debugging
+        if self.beam_width is not None:
+            graph.beam_width = self.beam_width
         fitness = 0
         try:
             graph.walk(board, size_limit=self.size_limit)
@@ -1,12 +1,16 @@
+import os
 import random
+import typing
 from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from dataclasses import dataclass
+from functools import lru_cache
 from itertools import count
 from textwrap import dedent
 
-from networkx import Graph, minimum_spanning_edges
+import numpy as np
 
 from domino_puzzle import Board, Domino
-from evo import Evolution, Individual
+from evo import Evolution, Individual, read_checkpoint
 
 
 def parse_args():
@@ -25,29 +29,75 @@ def parse_args():
                         type=int,
                         default=6,
                         help='Width of layout')
+    parser.add_argument('--resume',
+                        help='Checkpoint file to save progress in. If it '
+                             'exists, the search continues from it.')
     return parser.parse_args()
 
 
-def mountain_score(board: Board):
-    graph = Graph()
-    for x1 in range(board.width):
-        for y1 in range(board.height):
-            pips1 = board[x1][y1].pips
-            for dx, dy in Domino.directions[2:]:
-                x2 = x1 + dx
-                if x2 < 0:
-                    continue
-                y2 = y1 + dy
-                if y2 < 0:
-                    continue
-                pips2 = board[x2][y2].pips
-                weight = abs(pips2-pips1)
-                if weight < 2:
-                    weight = 0
-                graph.add_edge((x1, y1), (x2, y2), weight=weight)
-
-    score = sum(d['weight'] for u, v, d in minimum_spanning_edges(graph, keys=True))
-
+@lru_cache(maxsize=None)
+def get_grid_edges(width: int,
+                   height: int) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """ List the pairs of neighbouring cells on a grid.
+
+    :return: (starts, ends) arrays with the cell numbers, y*width + x, of
+        each pair.
+    """
+    cells = np.arange(width * height).reshape(height, width)
+    starts = np.concatenate([cells[:, :-1].ravel(), cells[:-1, :].ravel()])
+    ends = np.concatenate([cells[:, 1:].ravel(), cells[1:, :].ravel()])
+    return starts, ends
+
+
+def mountain_score(board: Board) -> int:
+    pips = np.array([[board[x][y].pips for x in range(board.width)]
+                     for y in range(board.height)])
+    return score_pips(pips)
+
+
+def read_pips(start: str) -> np.ndarray:
+    """ Read the pips from a board display, without building a Board.
+
+    :return: an array of shape (height, width), with the bottom row first,
+        like the board's y coordinates.
+    """
+    cell_lines = start.splitlines()[::2]
+    return np.array([[int(pips) for pips in line[::2]]
+                     for line in reversed(cell_lines)])
+
+
+def score_pips(pips: np.ndarray) -> int:
+    """ Add up the climbs on the cheapest path network between all cells.
+
+    Neighbouring cells are joined by an edge that costs the difference in
+    their pips, but differences less than 2 are free. The score is the
+    weight of the minimum spanning tree, found with Kruskal's algorithm.
+    :param pips: an array of shape (height, width)
+    """
+    height, width = pips.shape
+    pips = pips.ravel()
+    starts, ends = get_grid_edges(width, height)
+    weights = np.abs(pips[starts] - pips[ends])
+    weights[weights < 2] = 0
+    order = np.argsort(weights, kind='stable')
+
+    parents = list(range(width * height))  # Union-find forest of cells.
+    join_count = len(parents) - 1
+    score = 0
+    for start, end, weight in zip(starts[order].tolist(),
+                                  ends[order].tolist(),
+                                  weights[order].tolist()):
+        while parents[start] != start:
+            parents[start] = start = parents[parents[start]]
+        while parents[end] != end:
+            parents[end] = end = parents[parents[end]]
+        if start == end:
+            continue
+        parents[start] = end
+        score += weight
+        join_count -= 1
+        if join_count == 0:
+            break
     return score
 
 
@@ -78,7 +128,11 @@ class MountainsProblem(Individual):
         #         self_head[i] = mapping[self_head[i]]
 
         # return DominosaProblem(np.hstack([self_head, other_tail]))
-        return MountainsProblem(self.value)
+        child = MountainsProblem(self.value)
+        # Mutate keeps these along with the fitness, if the pips don't change.
+        child.results = dict(self.results)
+        child.results.pop('is_cached', None)
+        return child
 
     def mutate(self, mutate_params):
         self.value: dict
@@ -87,8 +141,16 @@ class MountainsProblem(Individual):
                              max_pips=max_pips)
         board.extra_dominoes.clear()
         new_board = board.mutate(random, Board)
-        self.value = dict(start=new_board.display(),
-                          max_pips=max_pips)
+        new_value = dict(start=new_board.display(), max_pips=max_pips)
+        fitness = self.value.get('fitness')
+        if fitness is not None and board.has_same_pips(
+                new_board,
+                new_board.mutated_cells):
+            # The score only depends on the pips, so it can't have changed.
+            new_value['fitness'] = fitness
+        else:
+            self.results.clear()
+        self.value = new_value
 
 
 class MountainsFitnessCalculator:
@@ -113,8 +175,7 @@ class MountainsFitnessCalculator:
         fitness = value.get('fitness')
         if fitness is not None:
             return fitness
-        board = Board.create(value['start'])
-        fitness = -mountain_score(board)
+        fitness = -score_pips(read_pips(value['start']))
         self.summaries.append(f'{fitness}')
 
         value['fitness'] = fitness
@@ -131,7 +192,9 @@ class MountainsEvolution(Evolution):
                  mutate_params,
                  init_params,
                  pool_count: int = 1,
-                 deal_num: int = 0):
+                 deal_num: int = 0,
+                 checkpoint_path: str = None,
+                 resume_path: str = None):
         super().__init__(pool_size,
                          fitness,
                          individual_class,
@@ -139,7 +202,9 @@ class MountainsEvolution(Evolution):
                          pair_params,
                          mutate_params,
                          init_params,
-                         pool_count)
+                         pool_count,
+                         checkpoint_path=checkpoint_path,
+                         resume_path=resume_path)
         self.deal_num = deal_num
 
     def is_finished(self):
@@ -159,20 +224,24 @@ class MountainsEvolution(Evolution):
               f'in {duration}.')
 
 
-def find_gaps():
+def find_gaps(batch_size: int = 10_000, tiling_count: int = 100):
     """ See how common impossible deals are: 5938/11720000 = 0.000507. """
     args = parse_args()
-    gap_count = 0
-    for i in count(1):
-        board = Board(args.columns, args.rows, args.max_pips)
-        while True:
-            if board.fill(random):
-                break
-        if has_gap(board):
-            print(board.display())
-            gap_count += 1
-        if i % 10000 == 0:
-            print(f'{gap_count}/{i} = {gap_count/i}')
+    rng = np.random.default_rng()
+    gap_count = deal_count = 0
+    while True:
+        deals = DealBatch.create(args.columns,
+                                 args.rows,
+                                 args.max_pips,
+                                 batch_size,
+                                 rng,
+                                 tiling_count)
+        gaps = deals.has_gaps()
+        for i in np.flatnonzero(gaps):
+            print(deals.create_board(i).display())
+        gap_count += int(gaps.sum())
+        deal_count += batch_size
+        print(f'{gap_count}/{deal_count} = {gap_count/deal_count}')
 
 
 def has_gap(board):
@@ -183,6 +252,113 @@ def has_gap(board):
     return numbers.intersection(required_numbers) != required_numbers
 
 
+def find_tilings(width: int,
+                 height: int,
+                 max_pips: int,
+                 tiling_count: int) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """ Fill random boards to find ways of covering them with dominoes.
+
+    :return: (heads, tails), each with shape (tiling_count, domino_count).
+        They hold the cell numbers, y*width + x, of each domino's ends, with
+        the lower number in heads.
+    """
+    domino_count = width * height // 2
+    heads = np.empty((tiling_count, domino_count), dtype=int)
+    tails = np.empty((tiling_count, domino_count), dtype=int)
+    for i in range(tiling_count):
+        board = Board(width, height, max_pips)
+        while True:
+            if board.fill(random):
+                break
+        for j, domino in enumerate(board.dominoes):
+            ends = sorted(cell.y*width + cell.x
+                          for cell in (domino.head, domino.tail))
+            heads[i, j], tails[i, j] = ends
+    return heads, tails
+
+
+@dataclass
+class DealBatch:
+    """ Random deals, with one row for each deal.
+
+    Only the pips change from deal to deal, so a few tilings can be shared
+    by thousands of deals.
+    """
+    max_pips: int
+    pips: np.ndarray  # (deal_count, height, width) pips in each cell
+    heads: np.ndarray  # (deal_count, domino_count) cell numbers of heads
+    tails: np.ndarray  # (deal_count, domino_count) cell numbers of tails
+
+    @classmethod
+    def create(cls,
+               width: int,
+               height: int,
+               max_pips: int,
+               deal_count: int,
+               rng: np.random.Generator,
+               tiling_count: int = 100) -> 'DealBatch':
+        """ Deal random dominoes onto random tilings.
+
+        Each deal draws dominoes from the set without replacement, and
+        flips half of them, on average.
+        :param tiling_count: number of tilings to find with Board.fill(),
+            and share among the deals.
+        """
+        all_heads, all_tails = find_tilings(width,
+                                            height,
+                                            max_pips,
+                                            tiling_count)
+        domino_count = all_heads.shape[1]
+        domino_set = np.array([(domino.head.pips, domino.tail.pips)
+                               for domino in Domino.create(max_pips)])
+        chosen = rng.random((deal_count, len(domino_set))).argsort(axis=1)
+        domino_pips = domino_set[chosen[:, :domino_count]]
+        is_flipped = rng.random((deal_count, domino_count)) < 0.5
+        head_pips = np.where(is_flipped,
+                             domino_pips[..., 1],
+                             domino_pips[..., 0])
+        tail_pips = np.where(is_flipped,
+                             domino_pips[..., 0],
+                             domino_pips[..., 1])
+
+        tiling_indexes = rng.integers(tiling_count, size=deal_count)
+        heads = all_heads[tiling_indexes]
+        tails = all_tails[tiling_indexes]
+        pips = np.empty((deal_count, 2*domino_count), dtype=int)
+        rows = np.arange(deal_count)[:, None]
+        pips[rows, heads] = head_pips
+        pips[rows, tails] = tail_pips
+        return cls(max_pips,
+                   pips.reshape(deal_count, height, width),
+                   heads,
+                   tails)
+
+    def has_gaps(self) -> np.ndarray:
+        """ Check all the deals at once, like has_gap().
+
+        :return: a boolean array with one entry for each deal.
+        """
+        deal_count = len(self.pips)
+        # has_gap() always needs 1 to 5, even when max_pips is lower.
+        is_present = np.zeros((deal_count, max(self.max_pips+1, 6)),
+                              dtype=bool)
+        is_present[np.arange(deal_count)[:, None],
+                   self.pips.reshape(deal_count, -1)] = True
+        return ~is_present[:, 1:6].all(axis=1)
+
+    def create_board(self, index: int) -> Board:
+        """ Build a Board object for one of the deals. """
+        pips = self.pips[index]
+        height, width = pips.shape
+        board = Board(width, height, self.max_pips)
+        for head, tail in zip(self.heads[index], self.tails[index]):
+            y, x = divmod(int(head), width)
+            domino = Domino(int(pips[y, x]), int(pips.flat[tail]))
+            domino.rotate_to(0 if tail - head == 1 else 90)
+            board.add(domino, x, y)
+        return board
+
+
 def solve_deal():
     init_params = dict(max_pips=6,
                        start=(dedent("""\
@@ -219,8 +395,24 @@ def main():
     longest_results = []
     shortest_results = []
     gap_count = 0
+    first_deal = 1
+    resume_path = args.resume
+    if resume_path is not None and os.path.exists(resume_path):
+        extras = read_checkpoint(resume_path)['extras']
+        first_deal = extras['deal_num']
+        gap_count = extras['gap_count']
+        longest_results = [tuple(result)
+                           for result in extras['longest_results']]
+        shortest_results = [tuple(result)
+                            for result in extras['shortest_results']]
+        if extras.get('is_deal_finished'):
+            # Its results are already counted, so start on the next deal.
+            first_deal += 1
+            resume_path = None
+    else:
+        resume_path = None
     fitness_calculator = MountainsFitnessCalculator()
-    for i in count(1):
+    for i in count(first_deal):
         if i % 100 == 0:
             print(f'Gap odds are {gap_count}/{i} = {gap_count/i}.')
             for generation_count, start in shortest_results:
@@ -229,15 +421,19 @@ def main():
             for generation_count, start in longest_results:
                 print(f'Long {generation_count}:')
                 print(start)
-        board = Board(args.columns, args.rows, args.max_pips)
-        while True:
-            if board.fill(random):
-                break
-        if has_gap(board):
-            gap_count += 1
-            print(f'{i}: Gap found.')
-            continue
-        init_params = dict(max_pips=args.max_pips, start=board.display())
+        if resume_path is None:
+            board = Board(args.columns, args.rows, args.max_pips)
+            while True:
+                if board.fill(random):
+                    break
+            if has_gap(board):
+                gap_count += 1
+                print(f'{i}: Gap found.')
+                continue
+            init_params = dict(max_pips=args.max_pips, start=board.display())
+        else:
+            # The deal is in the checkpoint.
+            init_params = dict(max_pips=args.max_pips)
         evo = MountainsEvolution(pool_size=100,
                                  fitness=fitness_calculator.calculate,
                                  individual_class=MountainsProblem,
@@ -245,7 +441,14 @@ def main():
                                  pair_params=None,
                                  mutate_params=None,
                                  init_params=init_params,
-                                 deal_num=i)
+                                 deal_num=i,
+                                 checkpoint_path=args.resume,
+                                 resume_path=resume_path)
+        resume_path = None  # Only the first deal resumes.
+        evo.checkpoint_extras = dict(deal_num=i,
+                                     gap_count=gap_count,
+                                     longest_results=longest_results,
+                                     shortest_results=shortest_results)
 
         evo.run(max_epochs=40000)
         top_individual = evo.pool.individuals[-1]
@@ -272,6 +475,12 @@ def main():
             print('New long:')
         if should_print:
             print(top_individual.value['start'])
+        evo.checkpoint_extras = dict(deal_num=i,
+                                     is_deal_finished=True,
+                                     gap_count=gap_count,
+                                     longest_results=longest_results,
+                                     shortest_results=shortest_results)
+        evo.save_checkpoint(len(evo.history))
 
 
 """
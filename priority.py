@@ -3,33 +3,45 @@ from heapq import heappush, heappop
 
 class PriorityQueue:
     def __init__(self):
-        self.item_heap = []  # [ [priority, item] ]
-        self.dummy = '<dummy entry>'
-        self.item_dict = {}  # { item: [priority, item] }
+        self.item_heap = []  # [ [priority, item, is_removed] ]
+        self.item_dict = {}  # { item: [priority, item, is_removed] }
 
     def __bool__(self):
         return bool(self.item_dict)
 
+    def __contains__(self, item):
+        return item in self.item_dict
+
     def add(self, item, priority=0):
         try:
             self.remove(item)
         except KeyError:
             pass
-        wrapper = [priority, item]
+        wrapper = [priority, item, False]
         heappush(self.item_heap, wrapper)
         self.item_dict[item] = wrapper
 
     def remove(self, item):
-        wrapper = self.item_dict[item]
-        wrapper[1] = self.dummy
+        wrapper = self.item_dict.pop(item)
+        wrapper[2] = True
+
+    def peek(self):
+        """ Return (priority, item) for the item that pop() would return. """
+        item_heap = self.item_heap
+        while item_heap and item_heap[0][2]:
+            heappop(item_heap)
+        if not item_heap:
+            raise KeyError('peek at an empty priority queue')
+        priority, item, _ = item_heap[0]
+        return priority, item
 
     def pop(self):
         while True:
             if not self.item_heap:
                 raise KeyError('pop from an empty priority queue')
             wrapper = heappop(self.item_heap)
-            item = wrapper[1]
-            if item is not self.dummy:
+            if not wrapper[2]:
                 break
+        item = wrapper[1]
         del self.item_dict[item]
-        return wrapper[1]
+        return item
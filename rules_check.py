@@ -11,6 +11,7 @@ from book_parser import parse, Styles
 from domino_puzzle import BoardAnalysis, Board
 from dominosa import DominosaBoard, FitnessCalculator, LEVEL_WEIGHTS, DominosaProblem
 from drivers import DriversFitnessCalculator, DriversProblem
+from fitness_cache import FitnessCache
 from mirror import MirrorFitnessCalculator, MirrorProblem
 
 
@@ -21,6 +22,9 @@ def parse_args():
                         help='Regex patterns for each heading level to filter '
                              'which solutions to check, separated by colons.',
                         default='.*:.*:.*:problem .*')
+    parser.add_argument('--cache',
+                        help='SQLite file to store fitness results in, so '
+                             'unchanged problems are skipped next time.')
     parser.add_argument('rules',
                         help='Rules file to check.',
                         type=FileType(),
@@ -39,6 +43,7 @@ def main():
     start_time = datetime.now()
     args = parse_args()
     rules_text = args.rules.read()
+    cache = None if args.cache is None else FitnessCache(args.cache)
 
     states = parse(rules_text)
     summaries = []
@@ -56,13 +61,13 @@ def main():
             heading = headings[-1]
             try:
                 if is_dominosa:
-                    summary = check_dominosa(state, heading)
+                    summary = check_dominosa(state, heading, cache)
                 elif is_mirror:
-                    summary = check_mirror(state, heading)
+                    summary = check_mirror(state, heading, cache)
                 elif is_bees:
-                    summary = check_bees(state, heading)
+                    summary = check_bees(state, heading, cache)
                 elif is_drivers:
-                    summary = check_drivers(state, heading)
+                    summary = check_drivers(state, heading, cache)
                 else:
                     summary = check_other(state, heading)
             except Exception as ex:
@@ -77,6 +82,9 @@ def main():
     duration = datetime.now() - start_time
     print(*summaries, sep='\n')
     print(f'Checked {len(summaries)} problems in {duration}.')
+    if cache is not None:
+        print(f'Fitness cache had {cache.hits} hits and {cache.misses} misses.')
+        cache.close()
 
 
 def headings_match(headings: typing.List[str], patterns: typing.List[str]) -> bool:
@@ -86,7 +94,7 @@ def headings_match(headings: typing.List[str], patterns: typing.List[str]) -> bo
     return True
 
 
-def check_dominosa(state, heading):
+def check_dominosa(state, heading, cache=None):
     """ Score solution to a Dominosa problem.
 
     Current fitness scores:
@@ -121,7 +129,7 @@ def check_dominosa(state, heading):
         move_weights = LEVEL_WEIGHTS['hard']
     else:
         move_weights = LEVEL_WEIGHTS['tricky']
-    fitness_calculator = FitnessCalculator(move_weights)
+    fitness_calculator = FitnessCalculator(move_weights, cache)
     board = DominosaBoard.create(state.text)
     board.max_pips = board.width - 2
     problem = DominosaProblem(dict(solution=board.display(),
@@ -131,7 +139,7 @@ def check_dominosa(state, heading):
     return n_text + '. ' + fitness_calculator.format_summaries()
 
 
-def check_mirror(state, heading):
+def check_mirror(state, heading, cache=None):
     """ Check solution to a mirror problem.
 
     Current details:
@@ -140,7 +148,7 @@ def check_mirror(state, heading):
     3. 4x3: 12 moves, max 9, avg 7.230769230769231, 1032 states
     4. 5x4: 14 moves, max 10, avg 7.466666666666667, 1582 states
     5. 5x4: 18 moves, max 9, avg 7.578947368421052, 7461 states
-    6. 5x4: 18 moves, max 10, avg 7.473684210526316, 3823 states
+    6. 5x4: 18 moves, max 10, avg 7.473684210526316, 3827 states
     7. 5x4: 18 moves, max 10, avg 8.210526315789474, 3933 states
     8. 5x4: 18 moves, max 11, avg 7.7368421052631575, 2513 states
     9. 5x4: 28 moves, max 11, avg 8.482758620689655, 23139 states
@@ -151,23 +159,27 @@ def check_mirror(state, heading):
     14. 6x5: 27 moves, max 10, avg 8.464285714285714, 8339 states
     15. 7x6: 41 moves, max 11, avg 8.357142857142858, 109348 states
     16. 7x6: 49 moves, max 10, avg 7.38, 96395 states
-    17. 7x6: 95 moves
-    18. 8x7: 84 moves
-    19. 8x7: 92 moves
-    20. 8x7: 393 moves
+
+    Problems 17 and up use a beam search, so their solutions don't match
+    the published ones (95, 84, 92, and 393 moves).
+    17. 7x6: 69 moves, max 12, avg 9.342857142857143, 191138 states
+    18. 8x7: 181 moves, max 13, avg 9.054945054945055, 530811 states
+    19. 8x7: 122 moves, max 11, avg 7.59349593495935, 231254 states
+    20. unsolved
     """
     n = heading.split(' ')[-1]
-    if int(n) >= 17:
-        return ''
     size_limit = 1_000_000
-    fitness_calculator = MirrorFitnessCalculator(size_limit=size_limit)
+    beam_width = 1000 if int(n) >= 17 else None
+    fitness_calculator = MirrorFitnessCalculator(size_limit=size_limit,
+                                                 beam_width=beam_width,
+                                                 cache=cache)
     problem = MirrorProblem(dict(start=state.text, max_pips=6))
     fitness_calculator.calculate(problem)
     print(n + '.', fitness_calculator.format_details())
     return n + '. ' + fitness_calculator.format_summaries()
 
 
-def check_bees(state, heading):
+def check_bees(state, heading, cache=None):
     """ Check solution to a Bee Donimoes problem.
 
     Current summaries:
@@ -194,21 +206,23 @@ def check_bees(state, heading):
     """
     n = heading.split(' ')[-1]
     size_limit = 11_200  # Found failures below 5,600, so doubled it.
-    fitness_calculator = BeesFitnessCalculator(size_limit=size_limit)
+    fitness_calculator = BeesFitnessCalculator(size_limit=size_limit,
+                                               cache=cache)
     problem = BeesProblem(dict(start=state.text))
     fitness_calculator.calculate(problem)
     print(n + '.', fitness_calculator.format_details())
     return n + '. ' + fitness_calculator.format_summaries()
 
 
-def check_drivers(state, heading):
+def check_drivers(state, heading, cache=None):
     """ Check solution to a Donimo Drivers problem.
 
     Current summaries:
     """
     n = heading.split(' ')[-1]
     size_limit = 20_000  # OOM at 2,560,000. Prob 1 unsolved btw 10,000 and 20,000
-    fitness_calculator = DriversFitnessCalculator(size_limit=size_limit)
+    fitness_calculator = DriversFitnessCalculator(size_limit=size_limit,
+                                                  cache=cache)
     problem = DriversProblem(dict(start=state.text))
     fitness_calculator.calculate(problem)
     print(n + '.', fitness_calculator.format_details())
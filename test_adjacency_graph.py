@@ -0,0 +1,75 @@
+from random import Random
+
+import pytest
+from networkx import DiGraph, NetworkXNoPath, NodeNotFound, shortest_path
+
+from adjacency_graph import AdjacencyGraph
+
+
+def test_add_edge():
+    graph = AdjacencyGraph()
+
+    graph.add_edge('a', 'b', move='ab')
+    graph.add_edge('a', 'c', move='ac')
+
+    assert len(graph) == 3
+    assert list(graph.nodes()) == ['a', 'b', 'c']
+    assert graph.has_node('c')
+    assert not graph.has_node('d')
+    assert graph.out_degree('a') == 2
+    assert graph.out_degree('b') == 0
+    assert graph.get_edge_data('a', 'c') == dict(move='ac')
+    assert graph.get_edge_data('c', 'a') is None
+    assert graph['a'] == {'b': dict(move='ab'), 'c': dict(move='ac')}
+
+
+def test_add_edge_again():
+    graph = AdjacencyGraph()
+
+    graph.add_edge('a', 'b', move='ab')
+    graph.add_edge('a', 'b', move='ab2', weight=3)
+
+    assert graph.out_degree('a') == 1
+    assert graph.get_edge_data('a', 'b') == dict(move='ab2', weight=3)
+
+
+def test_shortest_path_matches_networkx():
+    random = Random(42)
+    graph = AdjacencyGraph()
+    expected_graph = DiGraph()
+    for _ in range(300):
+        source = random.randrange(60)
+        target = random.randrange(60)
+        if source != target:
+            graph.add_edge(source, target, move=f'{source}-{target}')
+            expected_graph.add_edge(source, target, move=f'{source}-{target}')
+
+    for target in expected_graph.nodes():
+        try:
+            expected_path = shortest_path(expected_graph, 0, target)
+        except NetworkXNoPath:
+            with pytest.raises(NetworkXNoPath):
+                graph.shortest_path(0, target)
+            continue
+        assert graph.shortest_path(0, target) == expected_path
+
+
+def test_shortest_path_missing_node():
+    graph = AdjacencyGraph()
+    graph.add_edge('a', 'b', move='ab')
+
+    with pytest.raises(NodeNotFound):
+        graph.shortest_path('a', 'c')
+
+
+def test_to_networkx():
+    graph = AdjacencyGraph()
+    graph.add_node('a')
+    graph.add_edge('b', 'c', move='bc')
+    graph.add_edge('b', 'a', move='ba')
+
+    networkx_graph = graph.to_networkx()
+
+    assert list(networkx_graph.nodes()) == ['a', 'b', 'c']
+    assert list(networkx_graph.edges(data=True)) == [('b', 'c', dict(move='bc')),
+                                                     ('b', 'a', dict(move='ba'))]
@@ -1,5 +1,10 @@
-from bees import BeesBoard, BeesGraph
-from domino_puzzle import MoveDescription
+from concurrent.futures.process import ProcessPoolExecutor
+from unittest.mock import patch
+
+from bees import (BeesBoard, BeesFitnessCalculator, BeesGraph, BeesProblem,
+                  count_gaps)
+import domino_puzzle
+from domino_puzzle import MoveDescription, shutdown_worker_pool
 
 
 def test_create_with_dice():
@@ -223,12 +228,122 @@ dice:(2,0)2,(0,2)1
     expected_solution = ['1R2', '1D2R1']
     graph = BeesGraph(process_count=2)
 
-    graph.walk(board)
+    try:
+        graph.walk(board)
+    finally:
+        shutdown_worker_pool()
     solution = graph.get_solution()
 
     assert solution == expected_solution
 
 
+def test_solution_batch_sizes():
+    start_state = """\
+1|0 1|2
+
+3|1 3|3
+
+2|3 2|0
+---
+dice:(2,0)2,(0,2)1
+"""
+    expected_solution = ['1R2', '1D2R1']
+    results = []
+
+    try:
+        for batch_size in (0, 1, 32):
+            board = BeesBoard.create(start_state, max_pips=3)
+            graph = BeesGraph(process_count=2)
+            graph.expansion_batch_size = batch_size
+            graph.walk(board)
+            results.append((graph.get_solution(), len(graph.graph)))
+    finally:
+        shutdown_worker_pool()
+
+    assert results[0][0] == expected_solution
+    assert results[1] == results[0]
+    assert results[2] == results[0]
+
+
+def test_solution_reuses_worker_pool():
+    start_state = """\
+1|0 1|2
+
+3|1 3|3
+
+2|3 2|0
+---
+dice:(2,0)2,(0,2)1
+"""
+    expected_solution = ['1R2', '1D2R1']
+    solutions = []
+    pools = []
+
+    try:
+        for _ in range(2):
+            board = BeesBoard.create(start_state, max_pips=3)
+            graph = BeesGraph(process_count=2)
+            graph.walk(board)
+            solutions.append(graph.get_solution())
+            pools.append(domino_puzzle.worker_pool)
+    finally:
+        shutdown_worker_pool()
+
+    assert solutions == [expected_solution, expected_solution]
+    assert pools[0] is not None
+    assert pools[1] is pools[0]
+    assert domino_puzzle.worker_pool is None
+
+
+def test_fitness_starts_one_pool_for_all_queens():
+    start_state = """\
+1|0 1|2 4|4
+
+3|1 3|3 4|0
+
+2|3 2|0 4|1
+"""
+    problem = BeesProblem(dict(start=start_state, max_pips=4))
+    calculator = BeesFitnessCalculator(process_count=2)
+
+    with patch('domino_puzzle.ProcessPoolExecutor',
+               wraps=ProcessPoolExecutor) as executor_class:
+        try:
+            calculator.calculate(problem)
+        finally:
+            shutdown_worker_pool()
+
+    assert calculator.format_summaries() == """\
+Total moves: 5.
+    Moves for 3: 1R2, 1D2R1.
+    Moves for 4: 1R2, 1D2R3, 2R3U1."""
+    assert executor_class.call_count == 1
+
+
+def test_solution_shares_executor():
+    start_state = """\
+1|0 1|2
+
+3|1 3|3
+
+2|3 2|0
+---
+dice:(2,0)2,(0,2)1
+"""
+    expected_solution = ['1R2', '1D2R1']
+
+    with ProcessPoolExecutor(2) as executor:
+        solutions = []
+        for _ in range(2):
+            board = BeesBoard.create(start_state, max_pips=3)
+            graph = BeesGraph(process_count=2, executor=executor)
+            graph.walk(board)
+            solutions.append(graph.get_solution())
+            assert graph.executor is executor
+
+    assert solutions == [expected_solution, expected_solution]
+
+
 def test_solution_zero_length():
     start_state = """\
 0|0 1|2
@@ -334,6 +449,18 @@ def test_check_progress_min_gaps():
     assert gap == expected_gap
 
 
+def test_count_gaps_groups_chain():
+    chain = {(0, 4), (0, 0), (1, 0), (2, 0), (2, 1), (2, 2), (1, 2), (0, 2),
+             (0, 3)}
+    pair = {(0, 0), (0, 3)}
+
+    chain_gaps = count_gaps(chain, width=3, height=5)
+    pair_gaps = count_gaps(pair, width=3, height=5)
+
+    assert chain_gaps == 0
+    assert pair_gaps == 2
+
+
 def test_check_progress_win():
     start_state = """\
 3|5 5|5 4|4 2
@@ -368,3 +495,19 @@ def test_has_touching_blanks():
     board = BeesBoard.create(start_state, max_pips=3)
 
     assert board.has_touching_blanks
+
+
+def test_get_sight_lines():
+    board = BeesBoard.create("""\
+1|0 3|3
+
+3|2 3|0
+---
+dice:(0,1)1
+""", max_pips=3)
+
+    rows, columns = board.get_sight_lines()
+
+    assert rows[1] == (((0, 1), 1), ((1, 1), 0), ((2, 1), 3), ((3, 1), 3))
+    assert columns[1] == (((1, 0), 2), ((1, 1), 0))
+    assert board.get_sight_lines() is board.get_sight_lines()
@@ -198,6 +198,19 @@ def test_remove():
     assert board.dominoes == []
 
 
+def test_remove_equal_domino():
+    board = Board(3, 4)
+    domino1 = Domino(1, 5)
+    domino2 = Domino(5, 1)
+    board.add(domino1, 0, 0)
+    board.add(domino2, 0, 1)
+
+    board.remove(domino2)
+
+    assert board.dominoes == [domino1]
+    assert board.dominoes[0] is domino1
+
+
 def test_remove_and_rotate():
     board = Board(3, 4)
     domino1 = Domino(1, 5)
@@ -577,6 +590,145 @@ def test_is_not_connected():
     assert not board.is_connected()
 
 
+def test_is_connected_after_move():
+    state = """\
+1 0|2 x x
+-
+0 0|4 x x
+"""
+    board = Board.create(state)
+    domino = board[1][0].domino
+
+    domino.move(1, 0)
+    is_moved_connected = board.is_connected()
+    domino.move(1, 0)
+    is_moved_twice_connected = board.is_connected()
+    domino.move(-2, 0)
+
+    assert is_moved_connected
+    assert not is_moved_twice_connected
+    assert board.is_connected()
+
+
+def test_state_hash_matches_display():
+    state = """\
+1 0|2 x x
+-
+0 0|4 x x
+"""
+    board = Board.create(state)
+    start_hash = board.get_state_hash()
+    domino = board[1][0].domino
+
+    domino.move(1, 0)
+    moved_hash = board.get_state_hash()
+    cropped_hash = board.get_state_hash(cropped=True)
+    moved_copy = Board.create(board.display(cropped=True))
+    domino.move(-1, 0)
+
+    assert moved_hash != start_hash
+    assert moved_copy.get_state_hash(cropped=True) == cropped_hash
+    assert moved_copy.get_state_hash() != moved_hash
+    assert board.get_state_hash() == start_hash
+
+
+def test_state_hash_rotate():
+    board = Board(4, 3)
+    domino = Domino(5, 6)
+    board.add(domino, 1, 2)
+    start_hash = board.get_state_hash()
+
+    domino.rotate(-90)
+    rotated_hash = board.get_state_hash()
+    domino.rotate(90)
+
+    assert rotated_hash != start_hash
+    assert board.get_state_hash() == start_hash
+
+
+def test_state_hash_failed_rotate():
+    state = """\
+5|6 x x
+
+1|2 x x
+"""
+    board = Board.create(state)
+    start_hash = board.get_state_hash()
+    domino = board[0][1].domino
+
+    with pytest.raises(BoardError, match='Position 0, 2 is off the board.'):
+        domino.rotate(90)
+    with pytest.raises(BoardError, match='Position 0, 0 is occupied.'):
+        domino.rotate(-90)
+
+    assert domino.degrees == 0
+    assert board.display() == state
+    assert board.get_state_hash() == start_hash
+
+
+def test_state_hash_failed_cell_add():
+    board = Board(3, 2)
+    cell = Cell(4)
+    board.add(cell, 1, 1)
+    board.add(Cell(2), 0, 0)
+    start_hash = board.get_state_hash()
+
+    with pytest.raises(BoardError):
+        board.add(cell, 0, 0)
+    with pytest.raises(BoardError):
+        board.add(cell, 3, 0)
+
+    assert board[1][1] is cell
+    assert (cell.x, cell.y) == (1, 1)
+    assert board.get_state_hash() == start_hash
+
+
+def test_state_hash_distinct_states():
+    """ Every placement of two dominoes gets its own hash. """
+    board = Board(4, 3)
+    domino1 = Domino(1, 2)
+    domino2 = Domino(1, 1)
+    hashes = set()
+    displays = set()
+    pairs = set()
+    for degrees1 in range(0, 360, 90):
+        domino1.rotate_to(degrees1)
+        for x1 in range(board.width):
+            for y1 in range(board.height):
+                try:
+                    board.add(domino1, x1, y1)
+                except BoardError:
+                    continue
+                for degrees2 in range(0, 360, 90):
+                    domino2.rotate_to(degrees2)
+                    for x2 in range(board.width):
+                        for y2 in range(board.height):
+                            try:
+                                board.add(domino2, x2, y2)
+                            except BoardError:
+                                continue
+                            for cropped in (False, True):
+                                state_hash = board.get_state_hash(cropped)
+                                display = board.display(cropped=cropped)
+                                hashes.add((cropped, state_hash))
+                                displays.add((cropped, display))
+                                pairs.add((cropped, state_hash, display))
+                            board.remove(domino2)
+                board.remove(domino1)
+
+    assert len(hashes) == len(displays) == len(pairs)
+    assert len(displays) > 500
+
+
+def test_is_connected_through_single_cell():
+    state = """\
+1|0 3 0|2
+"""
+    board = Board.create(state)
+
+    assert board.is_connected()
+
+
 def test_has_no_loner():
     state = """\
 1 0 x 1|3
@@ -621,6 +773,15 @@ def test_has_match():
     assert board.hasMatch()
 
 
+def test_has_match_with_single_cell():
+    state = """\
+2 2|3
+"""
+    board = Board.create(state)
+
+    assert board.hasMatch()
+
+
 def test_find_no_match():
     state = """\
 1 0
@@ -690,6 +851,20 @@ def test_has_even_gaps_one_even_gap():
     assert has_even_gaps
 
 
+def test_has_even_gaps_two_even_gaps():
+    state = """\
+x 5 x x
+  -
+x 2 6 0
+    - -
+0|3 1 5
+"""
+    board = Board.create(state)
+    has_even_gaps = board.hasEvenGaps()
+
+    assert has_even_gaps
+
+
 def test_equal():
     state = """\
 0|4 0|5
@@ -5,7 +5,8 @@ from textwrap import dedent
 import pytest
 from networkx.exception import NodeNotFound
 
-from domino_puzzle import Domino, Cell, Board, BoardGraph, CaptureBoardGraph
+from domino_puzzle import (Domino, Cell, Board, BoardGraph, CaptureBoardGraph,
+                           PackedStateCodec, get_board_cells, CHECK_KEYS)
 
 
 class DummyRandom(object):
@@ -628,3 +629,206 @@ def test_mutate_after_removal():
         mutated = board.mutate(random)
 
         assert Domino(2, 2) not in mutated.dominoes
+
+
+def test_mutate_keeps_other_pips():
+    board = Board.create(dedent("""\
+        2|1 2|0
+
+        1|1 0|0"""), max_pips=2)
+    board.extra_dominoes.clear()
+
+    for _ in range(10):
+        mutated = board.mutate(random)
+        unchanged_cells = get_board_cells(4, 2) & ~mutated.mutated_cells
+
+        assert mutated.mutated_cells
+        assert board.has_same_pips(mutated, unchanged_cells)
+
+
+def test_packed_state_codec():
+    codec = PackedStateCodec()
+    state = """\
+0|0 1|2 x
+
+B|1 x 0|P
+---
+B1P2
+---
+dice:(1,1)3,(0,0)4
+"""
+
+    key = codec.encode(state)
+
+    assert isinstance(key, bytes)
+    assert codec.decode(key) == state
+
+
+def test_packed_state_codec_sorts_like_text():
+    codec = PackedStateCodec()
+    states = ['0|1\n', '0|1\n\n0|2\n', 'x 0|1\n', '0|1 x\n', '0|P\n', '0|1 #\n']
+
+    sorted_keys = sorted(codec.encode(state) for state in states)
+
+    assert [codec.decode(key) for key in sorted_keys] == sorted(states)
+
+
+class PackedBoardGraph(BoardGraph):
+    state_codec = PackedStateCodec()
+
+
+def test_walk_packed_states():
+    board = Board.create("""\
+6|2 3
+    -
+2|4 4
+""")
+    text_graph = BoardGraph()
+    expected_states = text_graph.walk(board)
+    expected_solution = text_graph.get_solution(return_partial=True)
+    graph = PackedBoardGraph()
+
+    states = graph.walk(board)
+    solution = graph.get_solution(return_partial=True)
+
+    assert states == expected_states
+    assert solution == expected_solution
+
+
+def test_describe_known_state():
+    board = Board.create("""\
+6|2 3
+    -
+2|4 4
+""")
+    graph = BoardGraph()
+    graph.known_state_count = 10
+    displays = []
+
+    def display():
+        displays.append(board.display(cropped=True))
+        return displays[-1]
+
+    state1 = graph.describe_state(board, display=display)
+    state2 = graph.describe_state(board, display=display)
+
+    assert state2 == state1
+    assert len(displays) == 1
+
+
+def test_describe_state_rejects_hash_collision():
+    board1 = Board.create("""\
+6|2 3
+    -
+2|4 4
+""")
+    board2 = Board.create("""\
+6|2 4
+    -
+2|4 3
+""")
+    graph = BoardGraph()
+    graph.known_state_count = 10
+    state1 = graph.describe_state(board1)
+    fake_check = board1.get_state_hash(cropped=True, key_set=CHECK_KEYS)
+    # Pretend that board2 has the same hash as board1.
+    graph.known_states[board2.get_state_hash(cropped=True)] = (fake_check,
+                                                               *state1)
+
+    display, _ = graph.describe_state(board2)
+
+    assert display == board2.display(cropped=True)
+
+
+def test_crop_matches_create():
+    state = """\
+x 0|0 1|2
+
+B|1 x 0|P
+
+2|2 0|1 x
+---
+B1P2
+"""
+    board = Board.create(state, border=1, max_pips=2)
+    expected_board = Board.create(board.display(cropped=True),
+                                  border=1,
+                                  max_pips=2)
+
+    cropped_board = board.crop(border=1)
+
+    assert cropped_board.display() == expected_board.display()
+    assert cropped_board.dominoes == expected_board.dominoes
+    assert cropped_board.markers == expected_board.markers
+    assert list(cropped_board.markers) == list(expected_board.markers)
+    assert cropped_board.extra_dominoes == expected_board.extra_dominoes
+
+
+def test_crop_dice():
+    state = """\
+x 0|0 1|2
+
+2 0|1 x
+-
+3 1|1 x
+---
+dice:(3,2)3,(0,1)2
+"""
+    board = Board.create(state, border=1)
+    expected_board = Board.create(board.display(cropped=True), border=1)
+
+    cropped_board = board.crop(border=1)
+
+    assert cropped_board.display() == expected_board.display()
+    assert list(cropped_board.dice_set.items()) == list(
+        expected_board.dice_set.items())
+
+
+def test_crop_repeated_markers():
+    state = """\
+0|0 1|2
+
+1|1 0|2
+---
+(0,0)B,(3,1)B,(1,1)A
+"""
+    board = Board.create(state, border=1)
+    expected_markers = {(2, 2): 'A', (1, 1): 'B', (4, 2): 'B'}
+
+    cropped_board = board.crop(border=1)
+
+    assert list(cropped_board.markers.items()) == list(
+        expected_markers.items())
+
+
+def test_apply_delta():
+    board = Board.create("""\
+0|0 1|2 x
+
+B|1 x 0|P
+---
+B1P2
+""")
+    start_display = board.display()
+    expected_display = """\
+0|0 1|2 x
+
+x B|1 0|P
+---
+B1P2
+"""
+    delta = (('domino', 0, 0, 1, 0), ('marker', 0, 0, 1, 0))
+
+    board.apply_delta(delta)
+    display = board.display()
+    board.apply_delta(delta, reverse=True)
+
+    assert display == expected_display
+    assert board.display() == start_display
+
+
+def test_cells_and_dominoes_have_no_dict():
+    domino = Domino(1, 2)
+
+    assert not hasattr(domino, '__dict__')
+    assert not hasattr(domino.head, '__dict__')
@@ -5,7 +5,8 @@ from domino_puzzle import MoveDescription
 from dominosa import DominosaBoard, PairState, DominosaGraph, DominosaProblem, \
     generate_moves_from_unique_pairs, generate_moves_from_single_neighbours, \
     generate_moves_from_newly_joined, generate_moves_from_newly_split, \
-    generate_moves_from_duplicate_neighbours, FitnessCalculator, strip_solution
+    generate_moves_from_duplicate_neighbours, FitnessCalculator, strip_solution, \
+    find_pairs_by_pips
 from svg_diagram import SvgDiagram
 
 # noinspection PyUnresolvedReferences
@@ -379,6 +380,39 @@ def test_display_pair_state():
     assert state == expected_state
 
 
+def test_count_unplaced():
+    board = DominosaBoard.create("""\
+1|1 0
+    s
+0 0j1
+""", max_pips=1)
+
+    remaining = board.count_unplaced()
+    board.set_pair_state(2, 0, 2, 1, PairState.NEWLY_JOINED)
+    remaining_with_duplicate = board.count_unplaced()
+
+    assert remaining == 1
+    assert remaining_with_duplicate == 1
+
+
+def test_find_pairs_by_pips():
+    board = DominosaBoard.create("""\
+1 0 1
+
+0 1 2
+""")
+
+    pairs = list(find_pairs_by_pips(board, 1, 0))
+    no_pairs = list(find_pairs_by_pips(board, 2, 2))
+
+    assert pairs == [(0, 0, 0, 1),
+                     (0, 0, 1, 0),
+                     (0, 1, 1, 1),
+                     (1, 0, 1, 1),
+                     (1, 1, 2, 1)]
+    assert no_pairs == []
+
+
 def test_random_init():
     expected_keys = {'solution', 'max_pips'}
 
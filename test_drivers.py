@@ -1,5 +1,8 @@
+import pytest
+
 from drivers import DriversBoard, DriversGraph
-from domino_puzzle import MoveDescription
+from domino_puzzle import (GraphLimitExceeded, MoveDescription,
+                           shutdown_worker_pool)
 
 
 def test_create_with_dice():
@@ -266,6 +269,32 @@ def test_solution():
     assert solution == expected_solution
 
 
+def test_size_limit_batch_sizes():
+    start_state = """\
+4|4 4|3
+
+0|0 1 1
+    - -
+2|4 0 1
+"""
+    results = []
+
+    try:
+        for process_count, batch_size in ((0, 0), (2, 3), (2, 32)):
+            board = DriversBoard.create(start_state, max_pips=4)
+            graph = DriversGraph(process_count=process_count)
+            graph.expansion_batch_size = batch_size
+            with pytest.raises(GraphLimitExceeded):
+                graph.walk(board, size_limit=300)
+            results.append(graph.get_states())
+    finally:
+        shutdown_worker_pool()
+
+    assert len(results[0]) == 301
+    assert results[1] == results[0]
+    assert results[2] == results[0]
+
+
 # def test_solution_zero_length():
 #     start_state = """\
 # 0|0 1|2
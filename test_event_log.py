@@ -0,0 +1,62 @@
+from event_log import EventLog, format_event, read_events
+
+
+def test_write_and_read(tmp_path):
+    path = tmp_path / 'events.jsonl'
+    with EventLog(path) as event_log:
+        event_log.write('epoch', epoch=0, best_fitness=-1.5)
+        event_log.write('pool', epoch=0, pool=1, state='1|2\n')
+
+    events = list(read_events(path))
+
+    assert [event['event'] for event in events] == ['epoch', 'pool']
+    assert events[0]['best_fitness'] == -1.5
+    assert events[1]['state'] == '1|2\n'
+    assert all(isinstance(event['time'], float) for event in events)
+
+
+def test_append(tmp_path):
+    path = tmp_path / 'events.jsonl'
+    with EventLog(path) as event_log:
+        event_log.write('epoch', epoch=0)
+    with EventLog(path) as event_log:
+        event_log.write('epoch', epoch=1)
+
+    events = list(read_events(path))
+
+    assert [event['epoch'] for event in events] == [0, 1]
+
+
+def test_buffered_until_flush(tmp_path):
+    path = tmp_path / 'events.jsonl'
+    event_log = EventLog(path)
+    event_log.write('epoch', epoch=0)
+
+    unflushed_events = list(read_events(path))
+    event_log.flush()
+    flushed_events = list(read_events(path))
+    event_log.close()
+
+    assert unflushed_events == []
+    assert [event['epoch'] for event in flushed_events] == [0]
+
+
+def test_partial_line_ignored(tmp_path):
+    path = tmp_path / 'events.jsonl'
+    path.write_text('{"event": "epoch", "epoch": 0}\n{"event": "ep')
+
+    events = list(read_events(path))
+
+    assert events == [dict(event='epoch', epoch=0)]
+
+
+def test_format_event():
+    event = dict(event='pool',
+                 time=1.5,
+                 epoch=3,
+                 best_fitness=-2,
+                 state='1|2\n')
+
+    assert format_event(event) == 'pool: epoch 3, best_fitness -2'
+    assert format_event(event, show_states=True) == (
+        'pool: epoch 3, best_fitness -2\n1|2')
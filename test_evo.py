@@ -0,0 +1,289 @@
+import os
+import random
+
+import pytest
+
+from event_log import EventLog, read_events
+from evo import Individual, Evolution, Population
+
+
+class CountingProblem(Individual):
+    def pair(self, other, pair_params):
+        return CountingProblem(dict(start=self.value['start'] + 1))
+
+    def mutate(self, mutate_params):
+        pass
+
+    def _random_init(self, init_params):
+        start = init_params['next_start']
+        init_params['next_start'] += 1
+        return dict(start=start)
+
+
+def calculate_fitness(problem):
+    value = problem.value
+    fitness = value.get('fitness')
+    if fitness is not None:
+        return fitness
+    fitness = value['fitness'] = value['start']
+    value['pid'] = os.getpid()
+    return fitness
+
+
+def test_step():
+    evo = Evolution(pool_size=4,
+                    fitness=calculate_fitness,
+                    individual_class=CountingProblem,
+                    n_offsprings=2,
+                    pair_params=None,
+                    mutate_params=None,
+                    init_params=dict(next_start=0))
+
+    evo.step()
+
+    assert [problem.value['start'] for problem in evo.pool.individuals] == [
+        1, 2, 3, 3]
+    assert all(problem.value['pid'] == os.getpid()
+               for problem in evo.pool.individuals)
+
+
+def test_step_in_parallel():
+    evo = Evolution(pool_size=4,
+                    fitness=calculate_fitness,
+                    individual_class=CountingProblem,
+                    n_offsprings=2,
+                    pair_params=None,
+                    mutate_params=None,
+                    init_params=dict(next_start=0),
+                    process_count=2)
+
+    evo.step()
+
+    assert [problem.value['start'] for problem in evo.pool.individuals] == [
+        1, 2, 3, 3]
+    assert [problem.value['fitness'] for problem in evo.pool.individuals] == [
+        1, 2, 3, 3]
+    # Workers calculated the fitness, so the parent never saw their pids.
+    assert all('pid' not in problem.value
+               for problem in evo.pool.individuals)
+
+
+class UnpickleCounter:
+    """ Fitness calculator that counts how often its process unpickled it. """
+    unpickle_count = 0
+
+    def __getstate__(self):
+        return {'name': 'counter'}
+
+    def __setstate__(self, state):
+        UnpickleCounter.unpickle_count += 1
+
+    def __call__(self, problem):
+        fitness = problem.value.get('fitness')
+        if fitness is not None:
+            return fitness
+        problem.results['unpickle_count'] = UnpickleCounter.unpickle_count
+        return problem.value['start']
+
+
+def test_fitness_sent_once_to_workers():
+    with Evolution(pool_size=4,
+                   fitness=UnpickleCounter(),
+                   individual_class=CountingProblem,
+                   n_offsprings=2,
+                   pair_params=None,
+                   mutate_params=None,
+                   init_params=dict(next_start=0),
+                   process_count=2) as evo:
+        for _ in range(3):
+            evo.step()
+
+    # Forked workers don't even need to unpickle it.
+    assert all(problem.results['unpickle_count'] <= 1
+               for problem in evo.pool.individuals)
+
+
+def test_close_workers():
+    with Evolution(pool_size=4,
+                   fitness=calculate_fitness,
+                   individual_class=CountingProblem,
+                   n_offsprings=2,
+                   pair_params=None,
+                   mutate_params=None,
+                   init_params=dict(next_start=0),
+                   process_count=2) as evo:
+        executor = evo.executor
+        evo.step()
+
+    assert evo.executor is None
+    with pytest.raises(RuntimeError):
+        executor.submit(print)
+
+
+def test_step_islands():
+    evo = Evolution(pool_size=4,
+                    fitness=calculate_fitness,
+                    individual_class=CountingProblem,
+                    n_offsprings=2,
+                    pair_params=None,
+                    mutate_params=None,
+                    init_params=dict(next_start=0),
+                    pool_count=2,
+                    process_count=2,
+                    island_epochs=2)
+
+    evo.step()
+
+    # Each pool evolves for two epochs, then sends its top two to the other.
+    assert [[problem.value['start'] for problem in pool.individuals]
+            for pool in evo.pools] == [[3, 4, 7, 8], [6, 7, 7, 8]]
+    assert evo.evaluation_count == 8
+
+
+def test_run_islands():
+    evo = Evolution(pool_size=4,
+                    fitness=calculate_fitness,
+                    individual_class=CountingProblem,
+                    n_offsprings=2,
+                    pair_params=None,
+                    mutate_params=None,
+                    init_params=dict(next_start=0),
+                    pool_count=2,
+                    island_epochs=2)
+
+    evo.run(max_epochs=4)
+
+    assert len(evo.history) == 4
+    # The second migration finds copies of 8 and 9 in both pools already.
+    assert [[problem.value['start'] for problem in pool.individuals]
+            for pool in evo.pools] == [[7, 8, 8, 9], [8, 8, 8, 9]]
+
+
+def test_run_islands_partial_step():
+    evo = Evolution(pool_size=4,
+                    fitness=calculate_fitness,
+                    individual_class=CountingProblem,
+                    n_offsprings=2,
+                    pair_params=None,
+                    mutate_params=None,
+                    init_params=dict(next_start=0),
+                    pool_count=2,
+                    island_epochs=2)
+
+    evo.run(max_epochs=5)
+
+    assert len(evo.history) == 5
+    # Two pools breed two offspring for each of five epochs.
+    assert evo.evaluation_count == 20
+
+
+def test_immigrate_ignores_results():
+    pool = Population(2,
+                      calculate_fitness,
+                      CountingProblem,
+                      init_params=None,
+                      values=[dict(start=1), dict(start=2)])
+    pool.individuals[-1].results['solve_seconds'] = 1.0
+    immigrant = CountingProblem(dict(pool.individuals[-1].value))
+    immigrant.results['solve_seconds'] = 2.0
+
+    pool.immigrate([immigrant])
+
+    assert [problem.value['start'] for problem in pool.individuals] == [1, 2]
+    assert immigrant not in pool.individuals
+
+
+def test_log_epoch(tmp_path):
+    path = tmp_path / 'events.jsonl'
+    event_log = EventLog(path)
+    evo = Evolution(pool_size=4,
+                    fitness=calculate_fitness,
+                    individual_class=CountingProblem,
+                    n_offsprings=2,
+                    pair_params=None,
+                    mutate_params=None,
+                    init_params=dict(next_start=0),
+                    pool_count=2,
+                    event_log=event_log)
+
+    evo.step()
+    evo.log_epoch(0)
+
+    events = list(read_events(path))
+    assert [event['event'] for event in events] == ['pool', 'pool', 'epoch']
+    assert [event['pool'] for event in events[:2]] == [0, 1]
+    assert events[0]['best_fitness'] == 3
+    assert events[0]['state'] == 3
+    assert events[2]['evaluations'] == 4
+    assert events[2]['cache_hits'] == 0
+
+
+def test_resume_from_checkpoint(tmp_path):
+    path = str(tmp_path / 'checkpoint.json.gz')
+    params = dict(pool_size=4,
+                  fitness=calculate_fitness,
+                  individual_class=CountingProblem,
+                  n_offsprings=2,
+                  pair_params=None,
+                  mutate_params=None)
+    evo = Evolution(init_params=dict(next_start=0),
+                    checkpoint_path=path,
+                    **params)
+    evo.step()
+    evo.history.append(3)
+    evo.checkpoint_extras['deal'] = 7
+    evo.save_checkpoint(1)
+    expected_random = random.random()
+
+    resumed_evo = Evolution(init_params=dict(next_start=100),
+                            resume_path=path,
+                            **params)
+
+    assert [problem.value for problem in resumed_evo.pool.individuals] == [
+        problem.value for problem in evo.pool.individuals]
+    assert resumed_evo.start_epoch == 1
+    assert resumed_evo.history == [3]
+    assert resumed_evo.checkpoint_extras == dict(deal=7)
+    assert random.random() == expected_random
+
+
+def test_run_from_checkpoint(tmp_path):
+    path = str(tmp_path / 'checkpoint.json.gz')
+    params = dict(pool_size=4,
+                  fitness=calculate_fitness,
+                  individual_class=CountingProblem,
+                  n_offsprings=2,
+                  pair_params=None,
+                  mutate_params=None)
+    uninterrupted_evo = Evolution(init_params=dict(next_start=0), **params)
+    uninterrupted_evo.run(max_epochs=3)
+    evo = Evolution(init_params=dict(next_start=0),
+                    checkpoint_path=path,
+                    **params)
+    evo.run(max_epochs=2)
+
+    resumed_evo = Evolution(init_params=dict(next_start=0),
+                            checkpoint_path=path,
+                            resume_path=path,
+                            **params)
+    resumed_evo.run(max_epochs=3)
+
+    assert resumed_evo.history == uninterrupted_evo.history
+    assert [problem.value for problem in resumed_evo.pool.individuals] == [
+        problem.value for problem in uninterrupted_evo.pool.individuals]
+
+
+def test_resume_without_checkpoint(tmp_path):
+    path = str(tmp_path / 'checkpoint.json.gz')
+    evo = Evolution(pool_size=4,
+                    fitness=calculate_fitness,
+                    individual_class=CountingProblem,
+                    n_offsprings=2,
+                    pair_params=None,
+                    mutate_params=None,
+                    init_params=dict(next_start=0),
+                    resume_path=path)
+
+    assert evo.start_epoch == 0
+    assert [problem.value['start'] for problem in evo.pool.individuals] == [
+        0, 1, 2, 3]
@@ -0,0 +1,171 @@
+import pickle
+import sqlite3
+
+from fitness_cache import FitnessCache
+from mirror import MirrorFitnessCalculator, MirrorProblem
+
+
+def test_miss():
+    cache = FitnessCache()
+    summaries = []
+    details = []
+
+    fitness = cache.find('x', summaries, details)
+
+    assert fitness is None
+    assert summaries == []
+    assert details == []
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_hit():
+    cache = FitnessCache()
+    cache.store('x', -1.5, ['summary'], ['detail 1', 'detail 2'])
+    summaries = ['earlier']
+    details = []
+
+    fitness = cache.find('x', summaries, details)
+
+    assert fitness == -1.5
+    assert summaries == ['earlier', 'summary']
+    assert details == ['detail 1', 'detail 2']
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_evicts_least_recently_used():
+    cache = FitnessCache(max_size=2)
+    cache.store('a', 1, [], [])
+    cache.store('b', 2, [], [])
+    cache.find('a', [], [])
+
+    cache.store('c', 3, [], [])
+
+    assert cache.size == 2
+    assert cache.find('a', [], []) == 1
+    assert cache.find('b', [], []) is None
+    assert cache.find('c', [], []) == 3
+
+
+def test_store_again():
+    cache = FitnessCache(max_size=2)
+    cache.store('a', 1, [], [])
+    cache.store('a', 10, [], [])
+    cache.store('b', 2, [], [])
+
+    assert cache.size == 2
+    assert cache.find('a', [], []) == 10
+    assert cache.find('b', [], []) == 2
+
+
+def test_reopen(tmp_path):
+    path = str(tmp_path / 'fitness.db')
+    cache = FitnessCache(path)
+    cache.store('a', 1, ['summary'], [])
+    cache.close()
+
+    cache = FitnessCache(path)
+    summaries = []
+
+    assert cache.size == 1
+    assert cache.find('a', summaries, []) == 1
+    assert summaries == ['summary']
+
+
+def test_make_key_ignores_trailing_spaces():
+    key1 = FitnessCache.make_key('mirror', '1|2 \n\n3|4\n', 6)
+    key2 = FitnessCache.make_key('mirror', '1|2\n\n3|4', 6)
+    key3 = FitnessCache.make_key('mirror', '1|2\n\n3|4', 5)
+
+    assert key1 == key2
+    assert key1 != key3
+
+
+def test_calculator():
+    start_state = '''\
+1 1 0
+- - -
+0 1 0
+'''
+    cache = FitnessCache()
+    calculator = MirrorFitnessCalculator(cache=cache)
+    expected_fitness = calculator.calculate(
+        MirrorProblem(dict(start=start_state, max_pips=1)))
+    expected_summaries = calculator.format_summaries()
+    expected_details = calculator.format_details()
+    problem = MirrorProblem(dict(start=start_state, max_pips=1))
+
+    fitness = calculator.calculate(problem)
+
+    assert calculator.format_summaries() == expected_summaries
+    assert calculator.format_details() == expected_details
+    assert fitness == expected_fitness
+    assert problem.value['fitness'] == expected_fitness
+    assert problem.results['is_cached']
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_calculator_records_solve_seconds():
+    start_state = '''\
+1 1 0
+- - -
+0 1 0
+'''
+    cache = FitnessCache()
+    calculator = MirrorFitnessCalculator(cache=cache)
+    uncached_calculator = MirrorFitnessCalculator()
+    missed_problem = MirrorProblem(dict(start=start_state, max_pips=1))
+    hit_problem = MirrorProblem(dict(start=start_state, max_pips=1))
+    uncached_problem = MirrorProblem(dict(start=start_state, max_pips=1))
+
+    calculator.calculate(missed_problem)
+    calculator.calculate(hit_problem)
+    uncached_calculator.calculate(uncached_problem)
+
+    assert missed_problem.results['solve_seconds'] >= 0
+    assert 'solve_seconds' not in hit_problem.results
+    assert uncached_problem.results['solve_seconds'] >= 0
+
+
+def test_pickle(tmp_path):
+    path = str(tmp_path / 'fitness.db')
+    cache = FitnessCache(path, max_size=10)
+    cache.store('a', 1, [], [])
+    cache.find('a', [], [])
+
+    copied_cache = pickle.loads(pickle.dumps(cache))
+    copied_cache.store('b', 2, [], [])
+
+    assert copied_cache.max_size == 10
+    assert copied_cache.hits == 0
+    assert copied_cache.find('a', [], []) == 1
+    assert cache.find('b', [], []) == 2
+
+
+def test_size_shared_by_connections(tmp_path):
+    path = str(tmp_path / 'fitness.db')
+    cache1 = FitnessCache(path, max_size=2)
+    cache2 = FitnessCache(path, max_size=2)
+    cache1.store('a', 1, [], [])
+    cache2.store('b', 2, [], [])
+    cache2.store('b', 20, [], [])
+
+    cache1.store('c', 3, [], [])
+
+    assert cache1.size == 2
+    assert cache2.size == 2
+    assert cache2.find('a', [], []) is None
+
+
+def test_size_of_old_file(tmp_path):
+    path = str(tmp_path / 'fitness.db')
+    connection = sqlite3.connect(path)
+    connection.execute('CREATE TABLE fitness(key TEXT PRIMARY KEY, '
+                       'fitness REAL, summaries TEXT, details TEXT, '
+                       'last_used INTEGER)')
+    connection.execute("INSERT INTO fitness VALUES ('a', 1, '[]', '[]', 1)")
+    connection.commit()
+    connection.close()
+
+    cache = FitnessCache(path)
+
+    assert cache.size == 1
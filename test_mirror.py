@@ -314,3 +314,62 @@ def test_repeated_moves_in_summary():
     calculator.calculate(problem)
 
     assert calculator.format_summaries() == 'PR, NR2, RdU, NdU'
+
+
+def test_walk_without_board_cache():
+    start_state = '''\
+2|2 0 2
+    - -
+1|0 0 1
+'''
+    board = Board.create(start_state, max_pips=2)
+    graph = MirrorGraph()
+    states = graph.walk(board)
+    solution = graph.get_solution()
+    uncached_graph = MirrorGraph()
+    uncached_graph.board_cache_size = 0
+
+    uncached_states = uncached_graph.walk(board)
+    uncached_solution = uncached_graph.get_solution()
+
+    assert uncached_states == states
+    assert uncached_solution == solution
+
+
+def test_walk_with_small_board_cache():
+    start_state = '''\
+2|2 0 2
+    - -
+1|0 0 1
+'''
+    board = Board.create(start_state, max_pips=2)
+    graph = MirrorGraph()
+    states = graph.walk(board)
+    solution = graph.get_solution()
+    small_graph = MirrorGraph()
+    small_graph.board_cache_size = 2
+
+    small_states = small_graph.walk(board)
+    small_solution = small_graph.get_solution()
+
+    assert small_states == states
+    assert small_solution == solution
+    assert len(small_graph.expanded_boards) == 2
+    for parent_state, _ in small_graph.parent_moves.values():
+        assert parent_state in small_graph.expanded_boards
+
+
+def test_fitness_calculator_with_beam_search():
+    start_state = '''\
+2|2 0 2
+    - -
+1|0 0 1
+'''
+    problem = MirrorProblem(dict(start=start_state, max_pips=2))
+    calculator = MirrorFitnessCalculator(beam_width=1)
+    calculator.calculate(problem)
+
+    summaries = calculator.format_summaries()
+    details = calculator.format_details()
+    assert summaries == 'PR, NR2, RdD, NU, NdD, PdR'
+    assert details == '4x2: 7 moves, max 8, avg 5.875, 38 states'
@@ -1,7 +1,15 @@
+import gzip
+import json
+from argparse import Namespace
 from textwrap import dedent
+from unittest.mock import patch
+
+import numpy as np
+import pytest
 
 from domino_puzzle import Board
-from mountains import mountain_score
+from mountains import (DealBatch, MountainsProblem, has_gap, main,
+                       mountain_score, read_pips, score_pips)
 
 
 def test_simple():
@@ -24,3 +32,115 @@ def test_step():
     score = mountain_score(board)
 
     assert score == 2
+
+
+def test_cheapest_climbs():
+    start = dedent('''\
+        0|6 6
+            -
+        5|6 0''')
+
+    pips = read_pips(start)
+    score = score_pips(pips)
+
+    assert pips.tolist() == [[5, 6, 0], [0, 6, 6]]
+    assert score == 11
+    assert mountain_score(Board.create(start)) == 11
+
+
+def test_deal_batch():
+    rng = np.random.default_rng(0)
+
+    deals = DealBatch.create(width=4,
+                             height=3,
+                             max_pips=5,
+                             deal_count=20,
+                             rng=rng,
+                             tiling_count=3)
+    gaps = deals.has_gaps()
+
+    assert deals.pips.shape == (20, 3, 4)
+    for i in range(20):
+        board = deals.create_board(i)
+        assert len(set(board.dominoes)) == 6
+        assert [[board[x][y].pips for x in range(4)]
+                for y in range(3)] == deals.pips[i].tolist()
+        assert gaps[i] == has_gap(board)
+    assert gaps.any()
+    assert not gaps.all()
+
+
+def test_deal_batch_few_pips():
+    rng = np.random.default_rng(0)
+
+    deals = DealBatch.create(width=4,
+                             height=3,
+                             max_pips=3,
+                             deal_count=5,
+                             rng=rng,
+                             tiling_count=2)
+    gaps = deals.has_gaps()
+
+    for i in range(5):
+        assert gaps[i] == has_gap(deals.create_board(i))
+    assert gaps.all()
+
+
+def test_mutate_keeps_fitness_for_same_pips():
+    problem = MountainsProblem(dict(start='1|1', max_pips=1, fitness=-1))
+
+    problem.mutate(None)
+
+    # Only one domino, and it's a double, so the pips can't change.
+    assert problem.value == dict(start='1|1\n', max_pips=1, fitness=-1)
+
+
+def test_pair_and_mutate_keep_results_for_same_pips():
+    parent = MountainsProblem(dict(start='1|1', max_pips=1, fitness=-1))
+    parent.results.update(graph_size=10, solve_seconds=0.5, is_cached=True)
+
+    child = parent.pair(parent, None)
+    child.mutate(None)
+
+    assert child.value['fitness'] == -1
+    assert child.results == dict(graph_size=10, solve_seconds=0.5)
+
+
+def test_mutate_drops_fitness_for_new_pips():
+    problem = MountainsProblem(dict(start='1|0', max_pips=1, fitness=-1))
+
+    for _ in range(20):
+        problem.results['graph_size'] = 10
+        problem.mutate(None)
+
+        if problem.value['start'] == '0|1\n':
+            assert 'fitness' not in problem.value
+            assert problem.results == {}
+            break
+        problem.value['fitness'] = -1
+    else:
+        assert False, 'Never flipped.'
+
+
+def test_resume_skips_finished_deal(tmp_path):
+    checkpoint_path = str(tmp_path / 'mountains.json.gz')
+    result = [12, '1|2\n']
+    extras = dict(deal_num=5,
+                  is_deal_finished=True,
+                  gap_count=2,
+                  longest_results=[result],
+                  shortest_results=[result])
+    with gzip.open(checkpoint_path, 'wt') as checkpoint_file:
+        json.dump(dict(extras=extras), checkpoint_file)
+    args = Namespace(max_pips=6, rows=6, columns=6, resume=checkpoint_path)
+
+    with patch('mountains.parse_args', return_value=args), \
+            patch('mountains.MountainsEvolution',
+                  side_effect=KeyboardInterrupt) as evolution_class:
+        with pytest.raises(KeyboardInterrupt):
+            main()
+
+    kwargs = evolution_class.call_args.kwargs
+    assert kwargs['deal_num'] > 5
+    assert kwargs['resume_path'] is None
+    assert 'start' in kwargs['init_params']
@@ -59,3 +59,29 @@ def test_change_priority():
 
     with pytest.raises(KeyError):
         queue.pop()
+
+
+def test_contains():
+    queue = PriorityQueue()
+    queue.add('one', 1)
+    queue.add('two', 2)
+    queue.pop()
+
+    assert 'one' not in queue
+    assert 'two' in queue
+
+
+def test_peek():
+    queue = PriorityQueue()
+
+    queue.add('one', 3)
+    queue.add('two', 2)
+    queue.add('one', 1)
+
+    assert queue.peek() == (1, 'one')
+    assert queue.pop() == 'one'
+    assert queue.peek() == (2, 'two')
+    assert queue.pop() == 'two'
+
+    with pytest.raises(KeyError):
+        queue.peek()